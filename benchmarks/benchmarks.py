@@ -0,0 +1,217 @@
+"""Benchmarks for the hot paths of the green jobs pipeline.
+
+Each stage is benchmarked on synthetic job ads at several corpus sizes,
+reporting time (time_*), peak memory (peakmem_*) and throughput in ads
+per second (track_*_throughput). Classifier imbalance strategies are
+also compared by fit time, peak memory and held-out F1 (track_f1).
+Benchmarks run offline once the NLTK corpora used by clean_text have been
+downloaded.
+
+  Typical usage example:
+
+  asv run --python=same
+  asv continuous --python=same dev HEAD
+
+"""
+# ---------------------------------------------------------------------------------
+import copy
+import time
+
+import numpy as np
+
+from grjobs.pipeline.green_classifier import GreenClassifier
+from grjobs.pipeline.green_count import GreenLexicon
+from grjobs.pipeline.tuning import TrainingFeatures
+from grjobs.settings import IMBALANCE_STRATEGIES
+from grjobs.utils.text_cleaning_utils import clean_text, get_text_cleaner
+
+from benchmarks.synthetic import SYNTHETIC_GREEN_WORDS, generate_job_ads
+
+# ---------------------------------------------------------------------------------
+
+CORPUS_SIZES = [100, 1000, 10000]
+
+# number of job ads held out to score imbalance strategies on
+N_HELD_OUT = 2000
+
+
+def throughput(func, n_ads):
+    """Times one call of func and returns the number of ads processed per second."""
+    start = time.perf_counter()
+    func()
+    return n_ads / (time.perf_counter() - start)
+
+
+def setup_corpus():
+    """Generates and cleans the largest synthetic corpus once per run."""
+    job_ads = generate_job_ads(max(CORPUS_SIZES))
+    texts = [ad["job_title_raw"] + " " + ad["description"] for ad in job_ads]
+    return {
+        "job_ads": job_ads,
+        "texts": texts,
+        "clean_texts": [clean_text(text) for text in texts],
+    }
+
+
+class CleanText:
+    """Benchmarks clean_text, one job ad at a time."""
+
+    params = CORPUS_SIZES
+    param_names = ["n_ads"]
+    timeout = 600
+
+    def setup_cache(self):
+        return setup_corpus()
+
+    def setup(self, corpus, n_ads):
+        self.texts = corpus["texts"][:n_ads]
+        # load NLTK corpora outside of the timed code
+        get_text_cleaner()
+
+    def clean(self):
+        for text in self.texts:
+            clean_text(text)
+
+    def time_clean_text(self, corpus, n_ads):
+        self.clean()
+
+    def peakmem_clean_text(self, corpus, n_ads):
+        self.clean()
+
+    def track_clean_text_throughput(self, corpus, n_ads):
+        return throughput(self.clean, n_ads)
+
+    track_clean_text_throughput.unit = "ads/s"
+
+
+class GreenCount:
+    """Benchmarks green counts of cleaned job ads with GreenLexicon."""
+
+    params = CORPUS_SIZES
+    param_names = ["n_ads"]
+    timeout = 600
+
+    def setup_cache(self):
+        return setup_corpus()
+
+    def setup(self, corpus, n_ads):
+        self.clean_texts = corpus["clean_texts"][:n_ads]
+        self.green_lexicon = GreenLexicon(SYNTHETIC_GREEN_WORDS)
+
+    def count(self):
+        self.green_lexicon.transform(self.clean_texts)
+
+    def time_green_count(self, corpus, n_ads):
+        self.count()
+
+    def peakmem_green_count(self, corpus, n_ads):
+        self.count()
+
+    def track_green_count_throughput(self, corpus, n_ads):
+        return throughput(self.count, n_ads)
+
+    track_green_count_throughput.unit = "ads/s"
+
+
+class GreenClassifierFit:
+    """Benchmarks GreenClassifier.fit, including text cleaning."""
+
+    params = CORPUS_SIZES
+    param_names = ["n_ads"]
+    timeout = 1200
+
+    def setup_cache(self):
+        return setup_corpus()
+
+    def setup(self, corpus, n_ads):
+        self.job_ads = corpus["job_ads"][:n_ads]
+        get_text_cleaner()
+
+    def fit(self):
+        model = GreenClassifier(green_lexicon=GreenLexicon(SYNTHETIC_GREEN_WORDS))
+        model.fit(copy.deepcopy(self.job_ads), [ad["label"] for ad in self.job_ads])
+
+    def time_fit(self, corpus, n_ads):
+        self.fit()
+
+    def peakmem_fit(self, corpus, n_ads):
+        self.fit()
+
+    def track_fit_throughput(self, corpus, n_ads):
+        return throughput(self.fit, n_ads)
+
+    track_fit_throughput.unit = "ads/s"
+
+
+class GreenClassifierTransform:
+    """Benchmarks GreenClassifier.transform, including text cleaning."""
+
+    params = CORPUS_SIZES
+    param_names = ["n_ads"]
+    timeout = 1200
+
+    def setup_cache(self):
+        corpus = setup_corpus()
+        train_ads = generate_job_ads(max(CORPUS_SIZES), seed=0)
+        model = GreenClassifier(green_lexicon=GreenLexicon(SYNTHETIC_GREEN_WORDS))
+        model.fit(train_ads, [ad["label"] for ad in train_ads])
+        corpus["model"] = model
+        return corpus
+
+    def setup(self, corpus, n_ads):
+        self.job_ads = corpus["job_ads"][:n_ads]
+        self.model = corpus["model"]
+
+    def transform(self):
+        self.model.transform(copy.deepcopy(self.job_ads))
+
+    def time_transform(self, corpus, n_ads):
+        self.transform()
+
+    def peakmem_transform(self, corpus, n_ads):
+        self.transform()
+
+    def track_transform_throughput(self, corpus, n_ads):
+        return throughput(self.transform, n_ads)
+
+    track_transform_throughput.unit = "ads/s"
+
+
+class ImbalanceStrategy:
+    """Benchmarks fitting the classifier with each imbalance strategy, on
+    job ads cleaned and counted once."""
+
+    params = (list(IMBALANCE_STRATEGIES), CORPUS_SIZES[1:])
+    param_names = ["strategy", "n_ads"]
+    timeout = 1200
+
+    def setup_cache(self):
+        job_ads = generate_job_ads(max(CORPUS_SIZES) + N_HELD_OUT)
+        get_text_cleaner()
+        model = GreenClassifier(green_lexicon=GreenLexicon(SYNTHETIC_GREEN_WORDS))
+        return TrainingFeatures.from_job_ads(
+            model, job_ads, [ad["label"] for ad in job_ads]
+        )
+
+    def setup(self, features, strategy, n_ads):
+        self.features = features
+        self.model = GreenClassifier(
+            green_lexicon=GreenLexicon(SYNTHETIC_GREEN_WORDS),
+            imbalance_strategy=strategy,
+        )
+        self.train_rows = np.arange(n_ads)
+        self.held_out_rows = np.arange(len(features) - N_HELD_OUT, len(features))
+
+    def fit(self):
+        self.features.fit_classifier(self.model, self.train_rows)
+
+    def time_fit(self, features, strategy, n_ads):
+        self.fit()
+
+    def peakmem_fit(self, features, strategy, n_ads):
+        self.fit()
+
+    def track_f1(self, features, strategy, n_ads):
+        return self.features.score(self.model, {}, self.train_rows, self.held_out_rows)
+
+    track_f1.unit = "macro F1"
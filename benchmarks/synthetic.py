@@ -0,0 +1,175 @@
+"""Seeded generator of synthetic job ads and green lexicon for benchmarks.
+
+Job ads are assembled from templated sentences with the mix of casing,
+punctuation, bullet points, salaries and camel-cased enumerations found
+in real adverts, so that every stage of clean_text does realistic work.
+Green ads mention terms from SYNTHETIC_GREEN_WORDS, with some label noise.
+
+  Typical usage example:
+
+  job_ads = generate_job_ads(1000, seed=42)
+
+"""
+# ---------------------------------------------------------------------------------
+import random
+
+# ---------------------------------------------------------------------------------
+
+SYNTHETIC_GREEN_WORDS = [
+    "renewable energy",
+    "solar",
+    "wind turbine",
+    "recycling",
+    "waste management",
+    "carbon capture",
+    "low carbon",
+    "sustainability",
+    "biodiversity",
+    "water treatment",
+    "energy efficiency",
+    "heat pump",
+    "insulation",
+    "environmental consultancy",
+    "electric vehicle",
+    "net zero",
+    "green",
+    "ecology",
+    "conservation",
+    "emissions",
+]
+
+JOB_TITLES = [
+    "Software Engineer",
+    "Sales Executive",
+    "Registered Nurse",
+    "Warehouse Operative",
+    "Accounts Assistant",
+    "Project Manager",
+    "Customer Service Advisor",
+    "HGV Driver",
+    "Site Engineer",
+    "Data Analyst",
+    "Electrician",
+    "Marketing Coordinator",
+]
+
+GREEN_JOB_TITLES = [
+    "Renewable Energy Engineer",
+    "Sustainability Manager",
+    "Ecologist",
+    "Waste Management Operative",
+    "Solar PV Installer",
+    "Environmental Consultant",
+    "Heat Pump Engineer",
+    "Water Treatment Technician",
+]
+
+COMPANY_WORDS = ["Global", "Northern", "Apex", "Bright", "Union", "Summit", "Harbour"]
+SECTORS = ["construction", "retail", "healthcare", "logistics", "finance", "energy"]
+SKILLS = [
+    "communication",
+    "teamwork",
+    "Microsoft Excel",
+    "problem solving",
+    "stakeholder management",
+    "AutoCAD",
+    "Python",
+    "SQL",
+    "health and safety",
+    "customer service",
+    "time management",
+    "C++",
+]
+LOCATIONS = ["London", "Manchester", "Leeds", "Bristol", "Glasgow", "Cardiff"]
+
+SENTENCES = [
+    "We are looking for a {adjective} {title} to join our team in {location}.",
+    "{company} is a leading {sector} business with over {number} employees.",
+    "The successful candidate will have experience in {skill} and {skill}.",
+    "Responsibilities include:• managing {skill}• supporting the {sector} team",
+    "Salary: £{salary},000 - £{salary_max},000 per annum plus benefits.",
+    "You will report to the Head of {sector_title} and work closely with clients.",
+    "Key skills: {skill}/{skill}/{skill}.",
+    "This is an exciting opportunity to develop your career with {company}.",
+    "Please apply with your CV and a cover letter by {day}/{month}/2021.",
+    "Working hours are {hours} hours per week, Monday to Friday.",
+    "Applicants must hold a full UK driving licence.",
+    "Experience in {skill} is desirableTraining will be provided.",
+]
+
+GREEN_SENTENCES = [
+    "You will support our {green} programme across {location}.",
+    "{company} is committed to {green} and {green} in the {sector} sector.",
+    "Experience with {green} projects is essential.",
+    "The role focuses on {green}, reporting on {green} targets.",
+    "Join a team delivering {green} solutions to clients nationwide.",
+]
+
+ADJECTIVES = ["motivated", "experienced", "enthusiastic", "reliable", "skilled"]
+
+
+def _fill(sentence, rng):
+    """Fills the placeholders of a templated sentence."""
+    salary = rng.randint(18, 60)
+    sector = rng.choice(SECTORS)
+    replacements = {
+        "adjective": lambda: rng.choice(ADJECTIVES),
+        "title": lambda: rng.choice(JOB_TITLES),
+        "location": lambda: rng.choice(LOCATIONS),
+        "company": lambda: " ".join(rng.sample(COMPANY_WORDS, 2)) + " Ltd",
+        "sector": lambda: sector,
+        "sector_title": lambda: sector.title(),
+        "number": lambda: str(rng.randint(10, 5000)),
+        "skill": lambda: rng.choice(SKILLS),
+        "salary": lambda: str(salary),
+        "salary_max": lambda: str(salary + rng.randint(2, 15)),
+        "day": lambda: str(rng.randint(1, 28)),
+        "month": lambda: str(rng.randint(1, 12)),
+        "hours": lambda: str(rng.randint(16, 45)),
+        "green": lambda: rng.choice(SYNTHETIC_GREEN_WORDS),
+    }
+    parts = sentence.split("{")
+    filled = [parts[0]]
+    for part in parts[1:]:
+        name, rest = part.split("}", 1)
+        filled.append(replacements[name]() + rest)
+
+    return "".join(filled)
+
+
+def generate_job_ads(n_ads, seed=42, green_share=0.2, label_noise=0.02):
+    """Generates synthetic job ads.
+
+    Args:
+        n_ads: number of job ads to generate
+        seed: random seed, the same seed always gives the same ads
+        green_share: share of job ads that are green
+        label_noise: share of job ads whose label is flipped
+
+    Returns:
+        A list of job ad dictionaries with id, job_title_raw, description,
+        created and label (1 for green, 0 otherwise) keys.
+    """
+    rng = random.Random(seed)
+    job_ads = []
+    for i in range(n_ads):
+        green = rng.random() < green_share
+        sentences = rng.sample(SENTENCES, rng.randint(6, len(SENTENCES)))
+        if green:
+            for _ in range(rng.randint(1, 3)):
+                sentences.insert(
+                    rng.randrange(len(sentences) + 1), rng.choice(GREEN_SENTENCES)
+                )
+        title = rng.choice(GREEN_JOB_TITLES if green else JOB_TITLES)
+        label = int(green) if rng.random() >= label_noise else int(not green)
+        job_ads.append(
+            {
+                "id": str(i),
+                "job_title_raw": title,
+                "description": " ".join(_fill(sentence, rng) for sentence in sentences),
+                "created": f"2021-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                "label": label,
+            }
+        )
+
+    return job_ads
@@ -1,15 +1,20 @@
-"""grjobs."""
+"""grjobs.
+
+Logging is configured and the base config loaded on first access to
+grjobs.logger and grjobs.config, so that importing the package stays fast
+and free of side effects. Typed settings are read with
+grjobs.settings.get_settings().
+"""
 import logging
-import logging.config
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional
 
-import yaml
-from dotenv import load_dotenv
-
 
 def get_yaml_config(file_path: Path) -> Optional[dict]:
     """Fetch yaml config and return as dict if it exists."""
+    import yaml
+
     if file_path.exists():
         with open(file_path, "rt") as f:
             return yaml.load(f.read(), Loader=yaml.FullLoader)
@@ -24,16 +29,44 @@ error_out = str(PROJECT_DIR / "errors.log")
 
 # Read log config file
 _log_config_path = Path(__file__).parent.resolve() / "config/logging.yaml"
-_logging_config = get_yaml_config(_log_config_path)
-if _logging_config:
-    logging.config.dictConfig(_logging_config)
-
-# Define module logger
-logger = logging.getLogger(__name__)
 
 # base/global config
 _base_config_path = Path(__file__).parent.resolve() / "config/base.yaml"
-config = get_yaml_config(_base_config_path)
 
-# BUCKET and METAFLOW_PROFILE
-load_dotenv(f"{PROJECT_DIR}/.env.shared")
+
+@lru_cache(maxsize=None)
+def get_logger() -> logging.Logger:
+    """Configures logging from the log config file on first use and
+    returns the package logger."""
+    import logging.config
+
+    _logging_config = get_yaml_config(_log_config_path)
+    if _logging_config:
+        logging.config.dictConfig(_logging_config)
+
+    # Define module logger
+    return logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def get_config() -> Optional[dict]:
+    """Loads the base/global config on first use."""
+    return get_yaml_config(_base_config_path)
+
+
+def load_env():
+    """Loads BUCKET and METAFLOW_PROFILE from .env.shared into the environment.
+
+    Call before importing metaflow, which reads METAFLOW_PROFILE on import.
+    """
+    from dotenv import load_dotenv
+
+    load_dotenv(f"{PROJECT_DIR}/.env.shared")
+
+
+def __getattr__(name):
+    if name == "logger":
+        return get_logger()
+    if name == "config":
+        return get_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
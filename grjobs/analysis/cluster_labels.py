@@ -0,0 +1,94 @@
+# File: analysis/cluster_labels.py
+
+"""Module for naming job title clusters after their top tfidf bigrams.
+
+Clusters are named either per cluster, fitting a tfidf vectoriser to each
+cluster's job titles, or in one pass, fitting one vectoriser to all the
+clustered job titles and scoring bigrams by their summed tfidf per cluster.
+Clusters whose job titles contain no bigrams are given no terms.
+
+  Typical usage example:
+
+  cluster_names = get_cluster_tfidf_top_features(job_titles, labels, n_top=1)
+
+"""
+# ---------------------------------------------------------------------------------
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from grjobs.settings import get_analysis_settings
+
+# ---------------------------------------------------------------------------------
+# load analysis settings, overridden by GRJOBS_ANALYSIS_ environment variables
+analysis_settings = get_analysis_settings()
+
+
+def get_tfidf_top_features(sents, n_top=1):
+    """Gets the top tfidf feature for sentences.
+
+    Vectorises sentences using a tfidf vectoriser and returns the top n terms.
+
+    Returns:
+        top n terms based on tfidf score for documents, none if the
+        sentences have no bigrams.
+    """
+    vectoriser = TfidfVectorizer(
+        max_df=analysis_settings.max_df, stop_words="english", ngram_range=(2, 2)
+    )
+    try:
+        tfidf = vectoriser.fit_transform(sents)
+    except ValueError:
+        # raised when no bigrams are left to score
+        return np.array([], dtype=object)
+    importance = np.argsort(np.asarray(tfidf.sum(axis=0)).ravel())[::-1]
+    tfidf_feature_names = vectoriser.get_feature_names_out()
+    return tfidf_feature_names[importance[:n_top]]
+
+
+def get_cluster_tfidf_top_features(sents, labels, n_top=1) -> dict:
+    """Gets the top tfidf features for every cluster of sentences in one pass.
+
+    Vectorises all sentences with a single tfidf vectoriser, sums the tfidf rows
+    of each cluster with a sparse cluster indicator matrix and picks each cluster's
+    top n terms with argpartition. Only terms that occur in a cluster are
+    picked, so clusters without bigrams get no terms.
+
+    Returns:
+        A dictionary of cluster label to its top n terms, highest scoring first.
+    """
+    vectoriser = TfidfVectorizer(
+        max_df=analysis_settings.max_df, stop_words="english", ngram_range=(2, 2)
+    )
+    clusters, cluster_index = np.unique(labels, return_inverse=True)
+    try:
+        tfidf = vectoriser.fit_transform(sents)
+    except ValueError:
+        # raised when no cluster has bigrams left to score
+        return {cluster: np.array([], dtype=object) for cluster in clusters.tolist()}
+    # clusters x sentences matrix with a one where a sentence is in a cluster
+    indicator = sparse.csr_matrix(
+        (
+            np.ones(len(cluster_index), dtype=tfidf.dtype),
+            (cluster_index, np.arange(len(cluster_index))),
+        ),
+        shape=(len(clusters), len(cluster_index)),
+    )
+    cluster_tfidf = (indicator @ tfidf).toarray()
+
+    n_top = min(n_top, cluster_tfidf.shape[1])
+    top = np.argpartition(-cluster_tfidf, n_top - 1, axis=1)[:, :n_top]
+    top_scores = np.take_along_axis(cluster_tfidf, top, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+    tfidf_feature_names = vectoriser.get_feature_names_out()
+
+    # argpartition picks arbitrary terms for clusters with fewer than n_top
+    # terms, which score 0
+    return {
+        cluster: tfidf_feature_names[cluster_top[cluster_scores > 0]]
+        for cluster, cluster_top, cluster_scores in zip(
+            clusters.tolist(), top, top_scores
+        )
+    }
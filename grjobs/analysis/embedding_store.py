@@ -0,0 +1,150 @@
+# File: analysis/embedding_store.py
+
+"""Module for storing job title embeddings on disk across runs.
+
+Embeddings are keyed by a hash of the embedding model name and the
+normalised job title, so each title is only encoded once per model. Each
+model's embeddings are appended to a raw array file that is read as a
+memory-mapped array, with the keys of its rows in an index file.
+
+  Typical usage example:
+
+  store = EmbeddingStore("paraphrase-MiniLM-L6-v2")
+  embeddings = store.embed(job_titles, get_transformer().encode)
+
+"""
+# ---------------------------------------------------------------------------------
+import os
+import json
+import hashlib
+
+import numpy as np
+
+from grjobs import Path, logger
+from grjobs.settings import get_analysis_settings
+
+# ---------------------------------------------------------------------------------
+# load analysis settings, overridden by GRJOBS_ANALYSIS_ environment variables
+analysis_settings = get_analysis_settings()
+
+
+def normalise_title(title):
+    """Lowercases a job title and collapses its whitespace."""
+    return " ".join(title.lower().split())
+
+
+class EmbeddingStore:
+    """
+    Persistent store of job title embeddings from one embedding model.
+
+    Attributes:
+        model_name: name of the embedding model
+        store_path: directory holding the model's vectors.bin, keys.txt
+            and meta.json files
+        dtype: dtype embeddings are stored as, float16 or float32
+        index: dictionary of title key to row in the vectors file
+    """
+
+    def __init__(
+        self,
+        model_name,
+        store_dir=analysis_settings.embedding_store_path,
+        dtype=analysis_settings.embedding_dtype,
+    ):
+        self.model_name = model_name
+        self.store_path = Path(store_dir) / model_name.replace("/", "__")
+        self.store_path.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = self.store_path / "vectors.bin"
+        self.keys_path = self.store_path / "keys.txt"
+        self.meta_path = self.store_path / "meta.json"
+
+        self.dim = None
+        self.dtype = np.dtype(dtype)
+        if self.meta_path.exists():
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            self.dim = meta["dim"]
+            self.dtype = np.dtype(meta["dtype"])
+
+        self.index = {}
+        if self.keys_path.exists():
+            with open(self.keys_path) as f:
+                keys = f.read().split()
+            # ignore keys whose vectors were not fully written
+            keys = keys[: self.n_stored_vectors()]
+            self.index = {key: row for row, key in enumerate(keys)}
+
+    def key(self, title):
+        """Hashes the model name and normalised job title."""
+        return hashlib.blake2b(
+            "\x1f".join((self.model_name, normalise_title(title))).encode(),
+            digest_size=16,
+        ).hexdigest()
+
+    def n_stored_vectors(self):
+        if self.dim is None or not self.vectors_path.exists():
+            return 0
+        return os.path.getsize(self.vectors_path) // (self.dim * self.dtype.itemsize)
+
+    def vectors(self):
+        """Memory-maps the stored embeddings."""
+        return np.memmap(
+            self.vectors_path,
+            dtype=self.dtype,
+            mode="r",
+            shape=(len(self.index), self.dim),
+        )
+
+    def add(self, keys, embeddings):
+        """Appends embeddings of new keys to the store."""
+        embeddings = np.asarray(embeddings)
+        if self.dim is None:
+            self.dim = embeddings.shape[1]
+            with open(self.meta_path, "w") as f:
+                json.dump(
+                    {
+                        "model_name": self.model_name,
+                        "dim": self.dim,
+                        "dtype": self.dtype.name,
+                    },
+                    f,
+                )
+        # truncate vectors of keys that were never written to the index
+        with open(self.vectors_path, "ab") as f:
+            f.truncate(len(self.index) * self.dim * self.dtype.itemsize)
+            f.write(np.ascontiguousarray(embeddings, dtype=self.dtype).tobytes())
+        with open(self.keys_path, "a") as f:
+            f.write("".join(f"{key}\n" for key in keys))
+        self.index.update(
+            (key, row) for row, key in enumerate(keys, start=len(self.index))
+        )
+
+    def embed(self, titles, encode):
+        """Returns embeddings of job titles, encoding only titles not
+        already in the store.
+
+        Args:
+            titles: list of job titles
+            encode: function encoding a list of job titles as an array,
+                such as SentenceTransformer.encode
+
+        Returns:
+            A float32 array with one embedding per job title.
+        """
+        keys = [self.key(title) for title in titles]
+        new_titles = {}
+        for key, title in zip(keys, titles):
+            if key not in self.index and key not in new_titles:
+                new_titles[key] = normalise_title(title)
+        if new_titles:
+            logger.info(
+                f"Encoding {len(new_titles)} of {len(set(keys))} job titles "
+                f"not in the embedding store"
+            )
+            self.add(list(new_titles), encode(list(new_titles.values())))
+
+        if not keys:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        rows = np.array([self.index[key] for key in keys])
+
+        return np.asarray(self.vectors()[rows], dtype=np.float32)
@@ -13,7 +13,7 @@ from adjustText import adjust_text
 
 #
 from ojd_daps.dqa.data_getters import get_db_job_ads
-from grjobs import get_yaml_config, Path, PROJECT_DIR
+from grjobs.settings import get_analysis_settings
 from grjobs.analysis.run_analysis import (
     cluster_job_titles,
     label_job_title_clusters,
@@ -23,13 +23,11 @@ from grjobs.analysis.run_analysis import (
 )
 
 # ---------------------------------------------------------------------------------
-# load relevant config file
-analysis_params = get_yaml_config(
-    Path(str(PROJECT_DIR) + "/grjobs/config/analysis_config.yaml")
-)
+# load analysis settings, overridden by GRJOBS_ANALYSIS_ environment variables
+analysis_settings = get_analysis_settings()
 
 # load relevant asset path
-prop = fm.FontProperties(fname=str(PROJECT_DIR) + analysis_params["FONT_PATH"])
+prop = fm.FontProperties(fname=analysis_settings.font_path)
 
 
 def plot_job_title_clusters(labelled_jobs, random_cluster_no):
@@ -96,10 +94,10 @@ def plot_green_locations(labelled_jobs):
             green_job_locations.append(job["features"]["location"]["nuts_2_name"])
 
     all_locations = []
-    green_ids = get_job_ids(labelled_jobs)
+    green_ids = {str(job_id) for job_id in get_job_ids(labelled_jobs)}
     for job in get_recent_job_ads():
 
-        if job["id"] not in green_ids and "location" in job["features"].keys():
+        if str(job["id"]) not in green_ids and "location" in job["features"].keys():
             all_locations.append(job["features"]["location"]["nuts_2_name"])
 
     green_locations_df = pd.DataFrame(
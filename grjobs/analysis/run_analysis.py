@@ -4,29 +4,59 @@
 """
 # ---------------------------------------------------------------------------------
 import pandas as pd
-import statistics
 import umap
 import hdbscan
 import numpy as np
 import datetime
+import pickle
 
 from sentence_transformers import SentenceTransformer
-from sklearn.feature_extraction.text import TfidfVectorizer
 
 #
 from ojd_daps.dqa.data_getters import get_db_job_ads
-from grjobs import get_yaml_config, Path, PROJECT_DIR
-from grjobs.pipeline.green_count import load_pkl_from_s3
+from grjobs import Path
+from grjobs.settings import get_analysis_settings
+from grjobs.analysis.salary_analysis import salary_quantiles
+from grjobs.analysis.embedding_store import EmbeddingStore
+from grjobs.analysis.cluster_labels import (
+    get_cluster_tfidf_top_features,
+    get_tfidf_top_features,
+)
+from grjobs.utils.storage import get_object_store
+from grjobs.getters.labelled_jobs import (
+    labelled_jobs_path,
+    convert_labelled_jobs,
+    read_labelled_jobs,
+    read_source_version,
+)
 
 # ---------------------------------------------------------------------------------
-# load relevant config file
-analysis_params = get_yaml_config(
-    Path(str(PROJECT_DIR) + "/grjobs/config/analysis_config.yaml")
-)
+# load analysis settings, overridden by GRJOBS_ANALYSIS_ environment variables
+analysis_settings = get_analysis_settings()
+
+# get cluster model path
+cluster_model_path = analysis_settings.cluster_model_path
+
 
-def get_labelled_jobs(prefix="green_jobs_output"):
-    """loads labelled data as pickle from s3"""
-    return load_pkl_from_s3(prefix)
+def get_labelled_jobs(prefix="green_jobs_output", columns=None, **filters):
+    """loads labelled data from its local parquet dataset, converting it
+    from the pickle in s3 again whenever the pickle has changed since the
+    dataset was converted.
+
+    Only the requested columns are read. Job ads can be filtered by
+    start_date, end_date and label, see read_labelled_jobs.
+    """
+    dataset_path = labelled_jobs_path / prefix
+    store = get_object_store()
+    source_name = f"{prefix}.pkl"
+    source_version, _ = store.stat(source_name)
+    if read_source_version(dataset_path) != source_version:
+        # the labelled jobs output only holds green jobs
+        convert_labelled_jobs(
+            store.load_pickle(source_name), source_version, dataset_path, label="green"
+        )
+
+    return read_labelled_jobs(dataset_path, columns, **filters)
 
 
 def get_job_ids(labelled_jobs):
@@ -34,28 +64,69 @@ def get_job_ids(labelled_jobs):
     return [job["id"] for job in labelled_jobs]
 
 
-def get_recent_job_ads():
-    """gets recent job ads"""
-    jobs = [
-        job
-        for job in get_db_job_ads(limit=None, return_features=True)
-        if job["description"] != "[]"
-    ]
-    return [
-        job for job in jobs if job["created"] >= datetime.datetime(2021, 4, 1, 0, 0)
-    ]
+def get_recent_job_ads(
+    start_date=datetime.datetime.combine(
+        analysis_settings.salary_start_date, datetime.time()
+    ),
+):
+    """yields job ads created from start_date onwards.
+
+    get_db_job_ads takes no date bound, so every job ad in the database is
+    still read and the date is filtered in Python. Job ads are filtered as
+    they are read rather than held in memory first.
+    """
+    for job in get_db_job_ads(limit=None, return_features=True):
+        if job["description"] != "[]" and job["created"] >= start_date:
+            yield job
 
 
 def get_transformer():
     """loads sentence transformer responsible for embedding job titles."""
-    return SentenceTransformer(analysis_params["embedding_model"])
+    return SentenceTransformer(analysis_settings.embedding_model)
+
+
+def embed_job_titles(job_titles):
+    """Embeds job titles, encoding only titles not embedded by earlier runs."""
+    return EmbeddingStore(analysis_settings.embedding_model).embed(
+        job_titles, lambda titles: get_transformer().encode(titles)
+    )
+
 
+def save_cluster_model(reducer, cluster, file_path=cluster_model_path):
+    """Saves a fitted UMAP reducer and HDBSCAN clusterer as a pickle."""
+    Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(file_path, "wb") as f:
+        pickle.dump(
+            {
+                "embedding_model": analysis_settings.embedding_model,
+                "umap": reducer,
+                "hdbscan": cluster,
+            },
+            f,
+        )
+
+
+def load_cluster_model(file_path=cluster_model_path):
+    """Loads the UMAP reducer and HDBSCAN clusterer saved by cluster_job_titles."""
+    with open(file_path, "rb") as f:
+        cluster_model = pickle.load(f)
+    if cluster_model["embedding_model"] != analysis_settings.embedding_model:
+        raise ValueError(
+            f"Cluster model was fit on {cluster_model['embedding_model']} embeddings, "
+            f"not {analysis_settings.embedding_model}"
+        )
 
-def cluster_job_titles(labelled_jobs) -> pd.DataFrame:
+    return cluster_model
+
+
+def cluster_job_titles(labelled_jobs, save_model=False) -> pd.DataFrame:
     """Clusters unique job titles for jobs labelled green.
     
-    Encodes unique job titles using a sentence transformer. Reduces dimensionality of embeddings using UMAP to
+    Encodes unique job titles using a sentence transformer, reusing embeddings
+    stored by earlier runs. Reduces dimensionality of embeddings using UMAP to
     two dimensions. Clusters dimensionality-reduced job title embeddings using HBDSCAN.
+    If save_model is True, saves the fitted UMAP reducer and HDBSCAN clusterer so that
+    new job titles can be assigned to clusters with assign_clusters.
     
     Returns:
         A cluster dataframe which includes dimensionality reduced values, the cluster label, the 
@@ -65,23 +136,26 @@ def cluster_job_titles(labelled_jobs) -> pd.DataFrame:
     green_job_titles = list(
         set([job["job_title_raw"].lower() for job in labelled_jobs])
     )
-    model = get_transformer()
     # embed unique job titles
-    job_title_embeddings = model.encode(green_job_titles)
+    job_title_embeddings = embed_job_titles(green_job_titles)
 
     # reduce dim
-    umap_embeddings = umap.UMAP(
-        n_neighbors=analysis_params["n_neighbors"],
-        n_components=analysis_params["components"],
-        metric=analysis_params["umap_metric"],
-    ).fit_transform(job_title_embeddings)
+    reducer = umap.UMAP(
+        n_neighbors=analysis_settings.n_neighbors,
+        n_components=analysis_settings.components,
+        metric=analysis_settings.umap_metric,
+    )
+    umap_embeddings = reducer.fit_transform(job_title_embeddings)
 
-    # cluster reduced dim
+    # cluster reduced dim, keeping prediction data to assign new titles
     cluster = hdbscan.HDBSCAN(
-        min_cluster_size=analysis_params["cluster_size"],
-        metric=analysis_params["hdbscan_metric"],
-        cluster_selection_method=analysis_params["method"],
+        min_cluster_size=analysis_settings.cluster_size,
+        metric=analysis_settings.hdbscan_metric,
+        cluster_selection_method=analysis_settings.method,
+        prediction_data=save_model,
     ).fit(umap_embeddings)
+    if save_model:
+        save_cluster_model(reducer, cluster)
 
     # create df
     embedding_df = pd.DataFrame(umap_embeddings, columns=["x", "y"])
@@ -92,28 +166,40 @@ def cluster_job_titles(labelled_jobs) -> pd.DataFrame:
     return embedding_df
 
 
-def get_tfidf_top_features(sents, n_top=1):
-    """Gets the top tfidf feature for sentences.
-    
-    Vectorises sentences using a tfidf vectoriser and returns the top n terms.
-    
+def assign_clusters(new_titles, cluster_model=None) -> pd.DataFrame:
+    """Assigns new job titles to the clusters of a saved cluster model.
+
+    Projects the embeddings of unique new job titles with the fitted UMAP reducer and
+    predicts their HDBSCAN cluster without refitting either.
+
     Returns:
-        top n terms based on tfidf score for documents. 
+        A cluster dataframe with the same columns as cluster_job_titles.
     """
-    vectoriser = TfidfVectorizer(
-        max_df=analysis_params["max_df"], stop_words="english", ngram_range=(2, 2)
+    if cluster_model is None:
+        cluster_model = load_cluster_model()
+    job_titles = list(set([title.lower() for title in new_titles]))
+    umap_embeddings = cluster_model["umap"].transform(embed_job_titles(job_titles))
+    labels, probabilities = hdbscan.approximate_predict(
+        cluster_model["hdbscan"], umap_embeddings
     )
-    tfidf = vectoriser.fit_transform(sents)
-    importance = np.argsort(np.asarray(tfidf.sum(axis=0)).ravel())[::-1]
-    tfidf_feature_names = np.array(vectoriser.get_feature_names())
-    return tfidf_feature_names[importance[:n_top]]
+
+    embedding_df = pd.DataFrame(umap_embeddings, columns=["x", "y"])
+    embedding_df["labels"] = labels
+    embedding_df["sentence"] = job_titles
+    embedding_df["membership_probability"] = probabilities
+
+    return embedding_df
 
 
-def label_job_title_clusters(job_embedding_df, n_top=1) -> pd.DataFrame:
+def label_job_title_clusters(
+    job_embedding_df, n_top=1, method=analysis_settings.cluster_label_method
+) -> pd.DataFrame:
     """Labels job title clusters based on top tfidf features per cluster.
     
     Subsets embedding df to only include clustered job titles with cluster membership
-    probability above a threshold.  
+    probability above a threshold. If method is "per_cluster", fits a tfidf vectoriser
+    to each cluster's job titles. If method is "class_tfidf", fits one vectoriser to
+    all clustered job titles and scores terms by their summed tfidf per cluster.
     
     Returns:
         A cluster dataframe that also includes the cluster label associated with the cluster.
@@ -123,65 +209,70 @@ def label_job_title_clusters(job_embedding_df, n_top=1) -> pd.DataFrame:
         (job_embedding_df["labels"] != -1)
         & (
             job_embedding_df["membership_probability"]
-            > analysis_params["membership_prob"]
+            > analysis_settings.membership_prob
         )
     ].reset_index(drop=True)
-    cluster_names = []
-    for clust in list(set(job_embedding_df["labels"])):
-        sents = job_embedding_df[job_embedding_df["labels"] == clust][
-            "sentence"
-        ].tolist()
-        if len(sents) > 0:
-            tfidf_labels = get_tfidf_top_features(sents, n_top)
-            cluster_names.append((clust, tfidf_labels))
+    if method == "class_tfidf":
+        cluster_names = (
+            list(
+                get_cluster_tfidf_top_features(
+                    job_embedding_df["sentence"].tolist(),
+                    job_embedding_df["labels"].to_numpy(),
+                    n_top,
+                ).items()
+            )
+            if len(job_embedding_df)
+            else []
+        )
+    elif method == "per_cluster":
+        cluster_names = [
+            (clust, get_tfidf_top_features(sents.tolist(), n_top))
+            for clust, sents in job_embedding_df.groupby("labels")["sentence"]
+        ]
+    else:
+        raise ValueError(
+            f"Unknown cluster label method {method}, expected per_cluster or class_tfidf"
+        )
 
     cluster_names_df = pd.DataFrame(cluster_names, columns=["labels", "cluster_name"])
 
     return job_embedding_df.merge(cluster_names_df, how="left", on="labels")
 
 
-def get_salaries(labelled_jobs) -> list:
-    """Gets minimum annualised salaries and maximum annualised salaries of green and non green jobs. 
+def calculate_salary_quantiles(labelled_jobs, sketch=False) -> pd.DataFrame:
+    """Calculates minimum and maximum salary quantiles of green and non green jobs
+    in one pass over recent job ads.
+
+    If sketch is True, quantiles are estimated with a mergeable quantile sketch
+    so that memory use does not grow with the number of job ads.
 
     Returns:
-        two lists - the first list is the minimum annualised salary and the maximum annualised salary per green job
-        and the second contains the minimum annualised salary and the maximum annualised salary per non green job.  
+        A dataframe of salary quantiles indexed by green and non green.
     """
-    green_salaries = []
-    non_green_salaries = []
-    green_ids = get_job_ids(labelled_jobs)
-
-    for job in get_recent_job_ads():
-        if "salary" in job["features"].keys():
-            salary_range = [
-                job["features"]["salary"]["min_annualised_salary"],
-                job["features"]["salary"]["max_annualised_salary"],
-            ]
-            if job["id"] in green_ids:
-                green_salaries.append(salary_range)
-            else:
-                non_green_salaries.append(salary_range)
-
-    return green_salaries, non_green_salaries
+    return salary_quantiles(
+        get_recent_job_ads(), get_job_ids(labelled_jobs), sketch=sketch
+    )
 
 
-def calculate_median_salaries(labelled_jobs):
+def calculate_median_salaries(labelled_jobs, sketch=False):
     """Calculates median minimum salary and median maximum salary of labelled jobs. 
 
     Returns:
         four values - median min salary for green jobs, median max salary for green jobs,  median min salary for non green jobs, 
         median max salary for non green jobs.
     """
-    green_salaries, non_green_salaries = get_salaries(labelled_jobs)
+    medians = salary_quantiles(
+        get_recent_job_ads(), get_job_ids(labelled_jobs), quantiles=[0.5], sketch=sketch
+    )
 
     return (
-        f"the minimum median green salary is {statistics.median([sal[0] for sal in green_salaries])}",
-        f"the maximum median green salary is {statistics.median([sal[1] for sal in green_salaries])}",
-        f"the minimum median non green salary is {statistics.median([sal[0] for sal in non_green_salaries])}",
-        f"the maximum median non green salary is {statistics.median([sal[1] for sal in non_green_salaries])}",
+        f"the minimum median green salary is {medians.loc['green', 'min_annualised_salary_q0.5']}",
+        f"the maximum median green salary is {medians.loc['green', 'max_annualised_salary_q0.5']}",
+        f"the minimum median non green salary is {medians.loc['non green', 'min_annualised_salary_q0.5']}",
+        f"the maximum median non green salary is {medians.loc['non green', 'max_annualised_salary_q0.5']}",
     )
 
 
 if __name__ == "__main__":
-    labelled_jobs = get_labelled_jobs("green_jobs_output")
+    labelled_jobs = get_labelled_jobs("green_jobs_output", columns=["id"])
     calculate_median_salaries(labelled_jobs)
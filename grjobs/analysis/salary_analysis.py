@@ -0,0 +1,190 @@
+# File: analysis/salary_analysis.py
+
+"""Module for comparing salary quantiles of green and non green job ads.
+
+Job ads are streamed in chunks. Each chunk's salaries are collected into a
+dataframe and hash-joined against the set of green job IDs, and quantiles
+are accumulated per group. Quantiles are either exact, keeping every
+salary in memory, or estimated with a mergeable QuantileSketch, whose
+memory use does not grow with the number of job ads.
+
+  Typical usage example:
+
+  quantiles = salary_quantiles(get_recent_job_ads(), green_ids, sketch=True)
+
+"""
+# ---------------------------------------------------------------------------------
+import math
+import collections
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+from grjobs.settings import get_analysis_settings
+
+# ---------------------------------------------------------------------------------
+# load analysis settings, overridden by GRJOBS_ANALYSIS_ environment variables
+analysis_settings = get_analysis_settings()
+
+SALARY_COLUMNS = ["min_annualised_salary", "max_annualised_salary"]
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch with relative error guarantees.
+
+    Positive values are counted in logarithmically sized buckets, so any
+    quantile is estimated to within relative_accuracy of a value at that
+    rank (as in DDSketch). Sketches of different chunks of data can be
+    merged, and their size depends on the range of values rather than
+    their number.
+
+    Attributes:
+        relative_accuracy: maximum relative error of estimated quantiles
+        bucket_counts: counter of values per bucket index
+        zero_count: number of values less than or equal to zero
+        count: number of values added
+    """
+
+    def __init__(self, relative_accuracy=analysis_settings.sketch_relative_accuracy):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.bucket_counts = collections.Counter()
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, values):
+        """Adds an array of values, ignoring missing values."""
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        positive = values[values > 0]
+        indices, counts = np.unique(
+            np.ceil(np.log(positive) / self.log_gamma).astype(int), return_counts=True
+        )
+        self.bucket_counts.update(dict(zip(indices.tolist(), counts.tolist())))
+        self.zero_count += len(values) - len(positive)
+        self.count += len(values)
+
+    def merge(self, other):
+        """Adds the values counted by another sketch of the same accuracy."""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Can only merge sketches with the same relative accuracy")
+        self.bucket_counts.update(other.bucket_counts)
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def quantile(self, q):
+        """Estimates the q-th quantile, or returns nan if no values were added."""
+        if not self.count:
+            return np.nan
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        cumulative_count = self.zero_count
+        for index in sorted(self.bucket_counts):
+            cumulative_count += self.bucket_counts[index]
+            if cumulative_count > rank:
+                break
+
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+
+class ExactQuantiles:
+    """
+    Exact quantiles of all values added, with the same interface as
+    QuantileSketch.
+
+    Attributes:
+        chunks: arrays of values added
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def add(self, values):
+        """Adds an array of values, ignoring missing values."""
+        values = np.asarray(values, dtype=float)
+        self.chunks.append(values[~np.isnan(values)])
+
+    def merge(self, other):
+        """Adds the values of another ExactQuantiles."""
+        self.chunks.extend(other.chunks)
+
+    @property
+    def count(self):
+        return sum(len(chunk) for chunk in self.chunks)
+
+    def quantile(self, q):
+        """Returns the q-th quantile, or nan if no values were added."""
+        values = np.concatenate(self.chunks) if self.chunks else np.array([])
+        if not len(values):
+            return np.nan
+        # compact so that later calls do not concatenate again
+        self.chunks = [values]
+
+        return float(np.quantile(values, q))
+
+
+def salary_frame(job_ads):
+    """Collects the id and annualised salary range of job ads with a salary."""
+    salaries = [
+        (
+            job["id"],
+            job["features"]["salary"]["min_annualised_salary"],
+            job["features"]["salary"]["max_annualised_salary"],
+        )
+        for job in job_ads
+        if "salary" in job["features"]
+    ]
+    return pd.DataFrame(salaries, columns=["id"] + SALARY_COLUMNS)
+
+
+def salary_quantiles(
+    job_ads,
+    green_ids,
+    quantiles=analysis_settings.salary_quantiles,
+    sketch=False,
+    chunk_size=analysis_settings.salary_chunk_size,
+):
+    """Computes salary quantiles of green and non green job ads in one pass.
+
+    Args:
+        job_ads: iterable of job ad dictionaries with id and features keys
+        green_ids: IDs of green job ads
+        quantiles: quantiles to compute, between 0 and 1
+        sketch: estimate quantiles with a QuantileSketch instead of
+            keeping every salary in memory
+        chunk_size: number of job ads processed at a time
+
+    Returns:
+        A dataframe indexed by green and non green with one column per
+        salary column and quantile, e.g. min_annualised_salary_q0.5, and
+        the number of salaries in each group.
+    """
+    # IDs are compared as strings, as labelled job datasets store them as strings
+    green_ids = pd.Index({str(job_id) for job_id in green_ids})
+    accumulators = {
+        (group, column): QuantileSketch() if sketch else ExactQuantiles()
+        for group in ("green", "non green")
+        for column in SALARY_COLUMNS
+    }
+    job_ads = iter(job_ads)
+    for chunk in iter(lambda: list(islice(job_ads, chunk_size)), []):
+        salaries = salary_frame(chunk)
+        # hash join on job ad IDs
+        is_green = salaries["id"].astype(str).isin(green_ids).to_numpy()
+        for group, mask in (("green", is_green), ("non green", ~is_green)):
+            for column in SALARY_COLUMNS:
+                accumulators[group, column].add(salaries[column].to_numpy()[mask])
+
+    rows = {}
+    for group in ("green", "non green"):
+        row = {"n_salaries": accumulators[group, SALARY_COLUMNS[0]].count}
+        for column in SALARY_COLUMNS:
+            for q in quantiles:
+                row[f"{column}_q{q}"] = accumulators[group, column].quantile(q)
+        rows[group] = row
+
+    return pd.DataFrame.from_dict(rows, orient="index")
@@ -6,24 +6,60 @@
 
   green_words = get_expanded_green_words()
 
+  The pretrained word2vec binary is converted once to a native gensim
+  KeyedVectors file, optionally trimmed to the most frequent words and
+  stored as float16, which later runs memory-map rather than parse.
+
 """
 # ---------------------------------------------------------------------------------
 
 import glob
 import gensim
+import numpy as np
 
-from grjobs import get_yaml_config, Path, PROJECT_DIR
+from grjobs.settings import get_settings
 
 # ---------------------------------------------------------------------------------
 
-# Load config file
-grjobs_config = get_yaml_config(Path(str(PROJECT_DIR) + "/grjobs/config/base.yaml"))
+# load settings, overridden by GRJOBS_ environment variables
+settings = get_settings()
+
+
+def convert_word2vec_model(
+    vocab_limit=settings.w2v_vocab_limit,
+    float16=settings.w2v_float16,
+):
+    """Converts the pretrained word2vec binary to a native KeyedVectors file.
+
+    The binary is sorted by word frequency, so vocab_limit keeps the
+    vocab_limit most frequent words (all words if None). Vectors are
+    stored as float16 if float16 is True, halving the file size.
 
-# get green lists path
-green_list_path = str(PROJECT_DIR) + grjobs_config["GREEN_LIST_PATH"]
+    Returns:
+        The converted word2vec model.
+    """
+    w2v_model = gensim.models.KeyedVectors.load_word2vec_format(
+        str(settings.pretrained_path),
+        binary=True,
+        limit=vocab_limit,
+        datatype=np.float16 if float16 else np.float32,
+    )
+    # store vectors in their own .npy file so that they can be memory-mapped
+    w2v_model.save(str(settings.w2v_cache_path), separately=["vectors"])
 
-# get pretrained model path
-pretrained_model_path = str(PROJECT_DIR) + grjobs_config["PRETRAINED_PATH"]
+    return w2v_model
+
+
+def load_word2vec_model():
+    """Loads the converted word2vec model, converting it first if needed.
+
+    Vectors are memory-mapped read-only so that processes expanding
+    keywords at the same time share the same pages.
+    """
+    if not settings.w2v_cache_path.exists():
+        convert_word2vec_model()
+
+    return gensim.models.KeyedVectors.load(str(settings.w2v_cache_path), mmap="r")
 
 
 def get_expanded_green_words() -> list:
@@ -47,12 +83,11 @@ def get_expanded_green_words() -> list:
     """
 
     all_green_lists = [
-        open(file).read().split("\n") for file in glob.glob(green_list_path + "*.txt")
+        open(file).read().split("\n")
+        for file in glob.glob(str(settings.green_list_path / "*.txt"))
     ]
 
-    w2v_model = gensim.models.KeyedVectors.load_word2vec_format(
-        pretrained_model_path, binary=True
-    )
+    w2v_model = load_word2vec_model()
 
     expanded_queries = []
     for green_word in all_green_lists[1]:
@@ -60,7 +95,7 @@ def get_expanded_green_words() -> list:
             expanded_green_words = [
                 similar_term[0]
                 for similar_term in w2v_model.most_similar(
-                    green_word.split(), topn=grjobs_config["similar_words"]
+                    green_word.split(), topn=settings.similar_words
                 )
             ]
             for expanded_green_word in expanded_green_words:
@@ -78,7 +113,7 @@ def get_expanded_green_words() -> list:
         )
     )
 
-    with open(green_list_path + "all_green_words.txt", "w") as outfile:
+    with open(settings.green_list_path / "all_green_words.txt", "w") as outfile:
         outfile.write("\n".join(all_green_words))
 
     return all_green_words
@@ -0,0 +1,230 @@
+# File: getters/labelled_jobs.py
+
+"""Module for saving and loading labelled job ads as a Parquet dataset.
+
+Labelled job ads are stored in columns, partitioned by the date each ad
+was created, so that readers can load only the columns they need and
+skip the partitions and row groups outside a date range or label.
+The salary and location features used in the analyses are stored in
+their own columns, and the full features dictionary as json. A dataset
+converted from another source records the version of the source (its ETag
+or modification time) so that it can be converted again when the source
+changes.
+
+  Typical usage example:
+
+  write_labelled_jobs(labelled_jobs, dataset_path)
+  jobs = read_labelled_jobs(
+    dataset_path, columns=["id", "job_title_raw"], start_date=datetime.date(2021, 4, 1)
+  )
+
+"""
+# ---------------------------------------------------------------------------------
+import os
+import json
+import shutil
+import datetime
+from itertools import chain, islice
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from grjobs.settings import get_settings
+
+# ---------------------------------------------------------------------------------
+# get labelled jobs dataset path
+labelled_jobs_path = get_settings().labelled_jobs_path
+
+# records the source version of a converted dataset, ignored by readers
+# as its name starts with an underscore
+SOURCE_FILE_NAME = "_source.json"
+
+# number of job ads converted to columns at a time
+WRITE_BATCH_SIZE = 10000
+
+# partitions are hive-style directories, e.g. created_date=2021-04-01/
+DATE_PARTITIONING = ds.partitioning(
+    pa.schema([("created_date", pa.date32())]), flavor="hive"
+)
+
+# features stored in their own columns, as (column, feature, field)
+FEATURE_COLUMNS = [
+    ("min_annualised_salary", "salary", "min_annualised_salary"),
+    ("max_annualised_salary", "salary", "max_annualised_salary"),
+    ("nuts_2_name", "location", "nuts_2_name"),
+]
+
+COLUMN_TYPES = {
+    "id": pa.string(),
+    "job_title_raw": pa.string(),
+    "description": pa.string(),
+    "created": pa.timestamp("us"),
+    "min_annualised_salary": pa.float64(),
+    "max_annualised_salary": pa.float64(),
+    "nuts_2_name": pa.string(),
+    "features": pa.string(),
+}
+
+
+def _to_datetime(created):
+    """Parses a job ad's created value, a datetime or ISO format string."""
+    if isinstance(created, str):
+        return datetime.datetime.fromisoformat(created)
+    if not isinstance(created, datetime.datetime):
+        return datetime.datetime.combine(created, datetime.time())
+
+    return created
+
+
+def _to_record_batch(job_ads, schema=None):
+    """Converts job ad dictionaries to a record batch of labelled job columns."""
+    created = [_to_datetime(job["created"]) for job in job_ads]
+    features = [job.get("features") or {} for job in job_ads]
+    columns = {
+        "id": [str(job["id"]) for job in job_ads],
+        "job_title_raw": [job["job_title_raw"] for job in job_ads],
+        "description": [job["description"] for job in job_ads],
+        "created": created,
+        "created_date": [timestamp.date() for timestamp in created],
+        "label": [job["label"] for job in job_ads],
+    }
+    for column, feature, field in FEATURE_COLUMNS:
+        columns[column] = [
+            job_features.get(feature, {}).get(field) for job_features in features
+        ]
+    columns["features"] = [
+        json.dumps(job_features, default=str) for job_features in features
+    ]
+
+    if schema is None:
+        return pa.RecordBatch.from_pydict(
+            {
+                name: pa.array(values, type=COLUMN_TYPES.get(name))
+                for name, values in columns.items()
+            }
+        )
+
+    return pa.RecordBatch.from_pydict(columns, schema=schema)
+
+
+def write_labelled_jobs(labelled_jobs, dataset_path=labelled_jobs_path, label=None):
+    """Writes labelled job ads to a Parquet dataset partitioned by date.
+
+    Existing partitions for the dates written are replaced.
+
+    Args:
+        labelled_jobs: iterable of job ad dictionaries with id,
+            job_title_raw, description, created, features and label keys
+        dataset_path: directory of the Parquet dataset
+        label: label given to job ads without a label key, for example
+            when all the job ads are green
+    """
+    if label is not None:
+        labelled_jobs = (dict({"label": label}, **job) for job in labelled_jobs)
+    labelled_jobs = iter(labelled_jobs)
+    first_batch = list(islice(labelled_jobs, WRITE_BATCH_SIZE))
+    if not first_batch:
+        return
+    # the label type is taken from the first batch of job ads
+    first_record_batch = _to_record_batch(first_batch)
+    schema = first_record_batch.schema
+    record_batches = chain(
+        [first_record_batch],
+        (
+            _to_record_batch(batch, schema)
+            for batch in iter(lambda: list(islice(labelled_jobs, WRITE_BATCH_SIZE)), [])
+        ),
+    )
+    ds.write_dataset(
+        record_batches,
+        dataset_path,
+        schema=schema,
+        format="parquet",
+        partitioning=DATE_PARTITIONING,
+        existing_data_behavior="delete_matching",
+    )
+
+
+def read_source_version(dataset_path=labelled_jobs_path):
+    """Returns the version of the source a dataset was converted from, or
+    None if it was not converted by convert_labelled_jobs."""
+    try:
+        with open(os.path.join(dataset_path, SOURCE_FILE_NAME)) as f:
+            return json.load(f)["version"]
+    except FileNotFoundError:
+        return None
+
+
+def convert_labelled_jobs(
+    labelled_jobs, source_version, dataset_path=labelled_jobs_path, label=None
+):
+    """Replaces a dataset with labelled job ads converted from a source,
+    recording the source's version once they are all written.
+
+    Takes the same labelled_jobs and label as write_labelled_jobs.
+    """
+    # partitions of dates no longer in the source would otherwise be kept
+    shutil.rmtree(dataset_path, ignore_errors=True)
+    write_labelled_jobs(labelled_jobs, dataset_path, label)
+    os.makedirs(dataset_path, exist_ok=True)
+    with open(os.path.join(dataset_path, SOURCE_FILE_NAME), "w") as f:
+        json.dump({"version": source_version}, f)
+
+
+def labelled_jobs_filter(start_date=None, end_date=None, label=None):
+    """Builds a dataset filter on the created date range (inclusive) and label."""
+    conditions = []
+    if start_date is not None:
+        conditions.append(ds.field("created_date") >= start_date)
+    if end_date is not None:
+        conditions.append(ds.field("created_date") <= end_date)
+    if label is not None:
+        conditions.append(ds.field("label") == label)
+
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+
+    return expression
+
+
+def read_labelled_jobs_table(
+    dataset_path=labelled_jobs_path,
+    columns=None,
+    start_date=None,
+    end_date=None,
+    label=None,
+):
+    """Reads labelled job ads as an Arrow table.
+
+    Only the requested columns are read, and only from the date partitions
+    and row groups that can match the filters.
+
+    Args:
+        dataset_path: directory of the Parquet dataset
+        columns: list of columns to read, all columns if None
+        start_date: earliest created date to read, a datetime.date
+        end_date: latest created date to read, a datetime.date
+        label: only read job ads with this label
+
+    Returns:
+        An Arrow table of the requested columns.
+    """
+    dataset = ds.dataset(dataset_path, format="parquet", partitioning=DATE_PARTITIONING)
+    return dataset.to_table(
+        columns=columns, filter=labelled_jobs_filter(start_date, end_date, label)
+    )
+
+
+def read_labelled_jobs(dataset_path=labelled_jobs_path, columns=None, **filters):
+    """Reads labelled job ads as a list of dictionaries.
+
+    Takes the same filters as read_labelled_jobs_table. The features
+    column, if read, is decoded back to a dictionary.
+    """
+    jobs = read_labelled_jobs_table(dataset_path, columns, **filters).to_pylist()
+    for job in jobs:
+        if "features" in job:
+            job["features"] = json.loads(job["features"])
+
+    return jobs
@@ -0,0 +1,100 @@
+# File: pipeline/feature_cache.py
+
+"""Module for caching cleaned job descriptions and green counts on disk.
+
+Cached features are keyed by a hash of the job title, the job description
+and the version of the feature pipeline (the text cleaner and the green
+lexicon), so entries computed by an older pipeline are never returned.
+
+  Typical usage example:
+
+  with FeatureCache("features.sqlite", pipeline_version) as cache:
+    keys = [cache.key(ad["job_title_raw"], ad["description"]) for ad in job_ads]
+    cached = cache.get_many(keys)
+
+"""
+# ---------------------------------------------------------------------------------
+import hashlib
+import sqlite3
+
+# ---------------------------------------------------------------------------------
+
+# SQLite limits the number of variables in a single query
+QUERY_CHUNK_SIZE = 500
+
+
+class FeatureCache:
+    """
+    SQLite cache of cleaned job descriptions and green counts.
+
+    Attributes:
+        path: path to the SQLite database file
+        pipeline_version: version hash of the text cleaner and green lexicon
+    """
+
+    def __init__(self, path, pipeline_version):
+        self.path = str(path)
+        self.pipeline_version = pipeline_version
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS features ("
+            "key TEXT PRIMARY KEY, "
+            "pipeline_version TEXT, "
+            "clean_description TEXT, "
+            "green_count REAL)"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def key(self, job_title, description):
+        """Hashes a job ad's title and description with the pipeline version."""
+        return hashlib.blake2b(
+            "\x1f".join((job_title, description, self.pipeline_version)).encode(),
+            digest_size=16,
+        ).hexdigest()
+
+    def get_many(self, keys):
+        """Looks up cached features.
+
+        Returns:
+            A dictionary of key to (clean description, green count) for
+            every key found in the cache.
+        """
+        keys = list(set(keys))
+        cached = {}
+        for i in range(0, len(keys), QUERY_CHUNK_SIZE):
+            chunk = keys[i : i + QUERY_CHUNK_SIZE]
+            rows = self.connection.execute(
+                "SELECT key, clean_description, green_count FROM features "
+                f"WHERE key IN ({', '.join('?' * len(chunk))})",
+                chunk,
+            )
+            cached.update((key, (text, count)) for key, text, count in rows)
+
+        return cached
+
+    def put_many(self, keys, clean_descriptions, green_counts):
+        """Adds features to the cache."""
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO features VALUES (?, ?, ?, ?)",
+                (
+                    (key, self.pipeline_version, text, float(count))
+                    for key, text, count in zip(keys, clean_descriptions, green_counts)
+                ),
+            )
+
+    def prune(self):
+        """Deletes features computed by other versions of the pipeline."""
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM features WHERE pipeline_version != ?",
+                (self.pipeline_version,),
+            )
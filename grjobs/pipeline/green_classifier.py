@@ -6,31 +6,31 @@
 # ---------------------------------------------------------------------------------
 import numpy as np
 from collections import Counter
+from functools import cached_property
 import os
+import tempfile
 import json
-import pickle
 
 # %%
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report, confusion_matrix
-from imblearn.pipeline import Pipeline
-from imblearn.over_sampling import SMOTE
-from sklearn.feature_extraction.text import TfidfVectorizer
-from xgboost import XGBClassifier
+# scikit-learn, imblearn, XGBoost and scipy are imported in the methods
+# using them, as they are slow to import
+from grjobs.utils.text_cleaning_utils import clean_corpus, get_text_cleaner
+from grjobs.utils.profiling import profiler
+from grjobs.settings import IMBALANCE_STRATEGIES, get_settings
+from grjobs.pipeline.green_count import load_green_lexicon, read_jsonl
+from grjobs.pipeline.feature_cache import FeatureCache
+from grjobs.pipeline.model_bundle import ModelBundle, save_model_bundle
 
-# %%
-from grjobs.utils.text_cleaning_utils import clean_text
-from grjobs import get_yaml_config, Path, PROJECT_DIR
-from grjobs.pipeline.green_count import green_count
 # %%
 # ---------------------------------------------------------------------------------
-# Load config file
-grjobs_config = get_yaml_config(Path(str(PROJECT_DIR) + "/grjobs/config/base.yaml"))
-green_list_path = str(PROJECT_DIR) + grjobs_config["GREEN_LIST_PATH"]
-
-# %%
-# get model ouputs path
-pretrained_model_path = str(PROJECT_DIR) + grjobs_config["MODEL_OUTPUT_PATH"]
+# hyperparameters read from the settings, unless overridden by a model's params
+HYPERPARAMETER_NAMES = (
+    "min_df",
+    "max_df",
+    "max_depth",
+    "min_child_weight",
+    "n_estimators",
+)
 
 
 # %%
@@ -41,42 +41,273 @@ class GreenClassifier:
 
     Attributes:
         split_random_seed: int(default = 42)
+        n_jobs: number of processes used to clean job ads, -1 for
+        all cores (default = n_jobs setting)
+        chunk_size: number of job ads cleaned per process at a time
+        (default = chunk_size setting)
+        sparse: keep TF-IDF features as a sparse float32 matrix rather
+        than a dense array (default = sparse setting). XGBoost treats the
+        absent entries of a sparse matrix as missing rather than zero, so
+        sparse and dense models are not interchangeable.
+        cache_path: path to an SQLite feature cache of cleaned job
+        descriptions and green counts, no caching if None (default =
+        feature_cache_path setting)
+        green_lexicon: compiled GreenLexicon of green terms to count, the
+        expanded green words list is frozen into the model at fit time
+        if None (default = None)
+        params: dictionary of hyperparameters overriding the min_df,
+        max_df, max_depth, min_child_weight and n_estimators settings
+        (default = None)
+        imbalance_strategy: how the classifier handles imbalanced classes,
+        "smote" to oversample with SMOTE, "undersample" to randomly
+        undersample, "scale_pos_weight" or "sample_weight" to weight
+        classes by their inverse frequency in XGBoost, or "none" (default
+        = imbalance_strategy setting)
+        cascade: score job ads in two stages, classifying ads whose green
+        count is below the gate threshold as the gate class without
+        vectorising them (default = cascade setting)
+        gate_class: class of job ads with the lowest mean green count in
+        training, given to job ads below the gate threshold
+        gate_threshold: green count below which job ads are gated, the
+        highest gating at most the cascade_max_recall_loss setting of the
+        other classes' training ads, None if not fit
+        lexicon_version: version hash of the lexicon the model was fit with
+        classes_: class labels, in the order the classifier encodes them
+        bundle: ModelBundle the vectoriser and classifier are read from on
+        first use, if the model was loaded from a model bundle
 
     Methods:
         split_data(labelled_data): splits the data
         into test/train sets
         fit(X_train, y_train): fit the vectoriser and classifier
         to the split data
+        fit_streaming(train_path): fit the classifier to a json lines
+        file of labelled job ads too large to hold in memory
         transform(X_test): predict classes from vectorised text
         evaluate(y_test, y_pred): print classification report
         and confusion matrix based on pipeline
-        save_model(file_name): save model to pkl file
+        evaluate_cascade(X_test, y_test): compare the recall and speed of
+        cascade and full scoring
+        save_model(file_name): save model as a versioned model bundle
+        from_bundle(bundle): create a model from a ModelBundle
     """
 
-    def __init__(self, split_random_seed=42):
+    def __init__(
+        self,
+        split_random_seed=42,
+        n_jobs=None,
+        chunk_size=None,
+        sparse=None,
+        cache_path=None,
+        green_lexicon=None,
+        params=None,
+        imbalance_strategy=None,
+        cascade=None,
+    ):
+        # unset runtime options are read from the settings when the model
+        # is created, so that they can be overridden per run
+        settings = get_settings()
         self.split_random_seed = split_random_seed
+        self.n_jobs = settings.n_jobs if n_jobs is None else n_jobs
+        self.chunk_size = settings.chunk_size if chunk_size is None else chunk_size
+        self.sparse = settings.sparse if sparse is None else sparse
+        self.cache_path = (
+            settings.feature_cache_path if cache_path is None else cache_path
+        )
+        self.green_lexicon = green_lexicon
+        self.params = dict(params or {})
+        self.imbalance_strategy = imbalance_strategy or settings.imbalance_strategy
+        if self.imbalance_strategy not in IMBALANCE_STRATEGIES:
+            raise ValueError(
+                f"Unknown imbalance strategy {self.imbalance_strategy}, "
+                f"expected one of {', '.join(IMBALANCE_STRATEGIES)}"
+            )
+        self.cascade = settings.cascade if cascade is None else cascade
+        self.gate_class = None
+        self.gate_threshold = None
+        self.bundle = None
+
+    @classmethod
+    def from_bundle(cls, bundle, **kwargs):
+        """Creates a model from a ModelBundle, with runtime options such as
+        n_jobs given as keyword arguments. The vectoriser and classifier
+        are only read from the bundle when first used."""
+        model = cls(
+            sparse=bundle.manifest["sparse"],
+            green_lexicon=bundle.load_green_lexicon(),
+            **kwargs,
+        )
+        model.bundle = bundle
+        model.lexicon_version = bundle.manifest["lexicon_version"]
+        model.classes_ = np.array(bundle.manifest["classes"])
+        # bundles saved before cascade scoring have no gate
+        gate = bundle.manifest.get("gate")
+        if gate is not None:
+            model.gate_class = model.classes_[gate["class_index"]]
+            model.gate_threshold = gate["threshold"]
+
+        return model
+
+    @cached_property
+    def vectoriser(self):
+        """TF-IDF vectoriser, read from the model bundle on first use."""
+        if self.bundle is None:
+            raise AttributeError("GreenClassifier has not been fit")
+        return self.bundle.load_vectoriser()
+
+    @cached_property
+    def classifier(self):
+        """Classifier, read from the model bundle on first use."""
+        if self.bundle is None:
+            raise AttributeError("GreenClassifier has not been fit")
+        return self.bundle.load_classifier()
+
+    def hyperparameters(self):
+        """Returns the model's hyperparameters, from the settings unless
+        overridden by params."""
+        settings = get_settings()
+        hyperparameters = {
+            name: getattr(settings, name) for name in HYPERPARAMETER_NAMES
+        }
+        hyperparameters.update(self.params)
+
+        return hyperparameters
+
+    def load_lexicon(self):
+        """Loads the expanded green words list as the model's lexicon, unless
+        a lexicon was given. The lexicon is frozen into the model so that
+        scoring never depends on the green words list on disk."""
+        if self.green_lexicon is None:
+            self.green_lexicon = load_green_lexicon(
+                get_settings().green_list_path / "all_green_words.txt"
+            )
+        self.lexicon_version = self.green_lexicon.version
+
+    def fit_classifier(self, X, y_encoded):
+        """Fits an XGBoost classifier to features X and encoded labels,
+        handling class imbalance with the model's imbalance strategy."""
+        from xgboost import XGBClassifier
+
+        hyperparameters = self.hyperparameters()
+        classifier = XGBClassifier(
+            n_estimators=hyperparameters["n_estimators"],
+            max_depth=hyperparameters["max_depth"],
+            min_child_weight=hyperparameters["min_child_weight"],
+        )
+        sampler = None
+        fit_params = {}
+        if self.imbalance_strategy == "smote":
+            from imblearn.over_sampling import SMOTE
+
+            sampler = SMOTE(random_state=self.split_random_seed)
+        elif self.imbalance_strategy == "undersample":
+            from imblearn.under_sampling import RandomUnderSampler
+
+            sampler = RandomUnderSampler(random_state=self.split_random_seed)
+        elif self.imbalance_strategy == "scale_pos_weight":
+            class_counts = np.bincount(y_encoded)
+            if len(class_counts) != 2:
+                raise ValueError("scale_pos_weight needs exactly two classes")
+            classifier.set_params(scale_pos_weight=class_counts[0] / class_counts[1])
+        elif self.imbalance_strategy == "sample_weight":
+            from sklearn.utils.class_weight import compute_sample_weight
+
+            fit_params["sample_weight"] = compute_sample_weight("balanced", y_encoded)
+        if sampler is not None:
+            from imblearn.pipeline import Pipeline
+
+            classifier = Pipeline([("sampling", sampler), ("classifier", classifier)])
+
+        with profiler.stage("green_classifier.fit_classifier", X.shape[0]):
+            classifier.fit(X, y_encoded, **fit_params)
+        self.classifier = classifier
 
     def preprocess_text(self, job_ads):
 
-        for ad in job_ads:
-            ad["clean_description"] = clean_text(
-                ad["job_title_raw"] + " " + ad["description"]
-            )
+        clean_descriptions = clean_corpus(
+            (ad["job_title_raw"] + " " + ad["description"] for ad in job_ads),
+            n_jobs=self.n_jobs,
+            chunk_size=self.chunk_size,
+        )
+        with profiler.stage("green_classifier.clean_text", len(job_ads)):
+            for ad, clean_description in zip(job_ads, clean_descriptions):
+                ad["clean_description"] = clean_description
 
         return job_ads
 
     def preprocess_green_count(self, job_ads):
 
-        expanded_green_words = [word for word in open(green_list_path + "all_green_words.txt").read().split("\n") if word != '']
+        with profiler.stage("green_classifier.green_count", len(job_ads)):
+            green_counts = self.green_lexicon.transform(
+                [ad["clean_description"] for ad in job_ads]
+            )
+
+        for ad, ad_green_count in zip(job_ads, green_counts):
+            ad["green_count"] = float(ad_green_count)
+
+        return green_counts
+
+    def pipeline_version(self):
+        """Returns the version of the text cleaner and green lexicon."""
+        return get_text_cleaner().version + self.green_lexicon.version
 
-        for ad in job_ads:
-            ad["green_count"] = green_count(
-                ad["clean_description"], expanded_green_words
+    def preprocess(self, job_ads):
+        """Cleans job ads and counts green terms, reusing cached features
+        of previously seen job ads if a feature cache is set."""
+        if self.cache_path is None:
+            job_ads = self.preprocess_text(job_ads)
+            return self.preprocess_green_count(job_ads)
+
+        with FeatureCache(self.cache_path, self.pipeline_version()) as cache:
+            keys = [
+                cache.key(ad["job_title_raw"], ad["description"]) for ad in job_ads
+            ]
+            cached = cache.get_many(keys)
+            new_ads = [ad for ad, key in zip(job_ads, keys) if key not in cached]
+            if new_ads:
+                new_ads = self.preprocess_text(new_ads)
+                new_green_counts = self.preprocess_green_count(new_ads)
+                new_keys = [key for key in keys if key not in cached]
+                cache.put_many(
+                    new_keys,
+                    [ad["clean_description"] for ad in new_ads],
+                    new_green_counts,
+                )
+
+        for ad, key in zip(job_ads, keys):
+            if key in cached:
+                ad["clean_description"], ad["green_count"] = cached[key]
+
+        return np.array([ad["green_count"] for ad in job_ads], dtype=np.float32)
+
+    def stack_features(self, X_vec, green_counts):
+        """Appends green counts to the vectorised text as a final column."""
+        from scipy import sparse
+
+        if self.sparse:
+            return sparse.hstack(
+                (X_vec, sparse.csr_matrix(green_counts[:, None])),
+                format="csr",
+                dtype=np.float32,
             )
 
-        return [ad["green_count"] for ad in job_ads]
+        return np.hstack((X_vec.toarray(), green_counts[:, None]))
+
+    def featurise(self, job_ads, green_counts=None):
+        """Cleans and vectorises job ads with the fitted vectoriser, unless
+        their green counts are given, in which case they have been cleaned."""
+        if green_counts is None:
+            green_counts = self.preprocess(job_ads)
+        with profiler.stage("green_classifier.vectorise", len(job_ads)):
+            X_vec = self.vectoriser.transform(
+                [ad["clean_description"] for ad in job_ads]
+            )
+            X_green_vec = self.stack_features(X_vec, green_counts)
+
+        return X_green_vec
 
     def split_data(self, job_ads, test_size=0.15, verbose=False):
+        from sklearn.model_selection import train_test_split
 
         X = [{k: v for k, v in job_ad.items() if k != "label"} for job_ad in job_ads]
         y = [t["label"] for t in job_ads]
@@ -94,41 +325,175 @@ class GreenClassifier:
         return X_train, X_test, y_train, y_test
 
     def fit(self, X_train, y_train):
+        from sklearn.feature_extraction.text import TfidfVectorizer
 
-        X_train = self.preprocess_text(X_train)
-        green_counts = np.array(self.preprocess_green_count(X_train))
+        hyperparameters = self.hyperparameters()
+        self.load_lexicon()
+        green_counts = self.preprocess(X_train)
         self.vectoriser = TfidfVectorizer(
-            min_df=grjobs_config["min_df"], max_df=grjobs_config["max_df"]
+            min_df=hyperparameters["min_df"],
+            max_df=hyperparameters["max_df"],
+            dtype=np.float32 if self.sparse else np.float64,
         )
 
-        X_vec = self.vectoriser.fit_transform(
-            [x["clean_description"] for x in X_train]
-        ).toarray()
-        X_green_vec = np.hstack((X_vec, green_counts[:, None]))
-
-        # Fit classifier
-        self.classifier = Pipeline(
-            [
-                ("sampling", SMOTE(random_state=self.split_random_seed)),
-                (
-                    "classifier",
-                    XGBClassifier(
-                        max_depth=grjobs_config["max_depth"],
-                        min_child_weight=grjobs_config["min_child_weight"],
-                    ),
-                ),
-            ]
+        with profiler.stage("green_classifier.fit_vectoriser", len(X_train)):
+            X_vec = self.vectoriser.fit_transform(
+                [x["clean_description"] for x in X_train]
+            )
+            X_green_vec = self.stack_features(X_vec, green_counts)
+
+        # encode labels as 0..n_classes - 1, as XGBoost expects
+        self.classes_, y_encoded = np.unique(y_train, return_inverse=True)
+        self.fit_gate(green_counts, y_encoded)
+        self.fit_classifier(X_green_vec, y_encoded)
+
+    def fit_gate(self, green_counts, y_encoded):
+        """Learns the cascade gate from training green counts and encoded
+        labels.
+
+        The gate class is the class with the lowest mean green count. The
+        threshold is the highest green count such that the other classes'
+        training ads below it, which the gate would misclassify, make up
+        at most cascade_max_recall_loss of them, bounding the loss of
+        recall of the other classes. If no training ad is below that
+        threshold, no gate is learned and every job ad is scored by the
+        full model.
+        """
+        green_counts = np.asarray(green_counts)
+        mean_green_counts = [
+            green_counts[y_encoded == class_index].mean()
+            for class_index in range(len(self.classes_))
+        ]
+        gate_class_index = int(np.argmin(mean_green_counts))
+        other_green_counts = np.sort(green_counts[y_encoded != gate_class_index])
+        self.gate_class, self.gate_threshold = None, None
+        if not len(other_green_counts):
+            return
+        # at most max_gated of the other classes' ads are below threshold
+        max_gated = int(
+            get_settings().cascade_max_recall_loss * len(other_green_counts)
         )
-
-        self.classifier.fit(X_green_vec, y_train)
+        gate_threshold = float(other_green_counts[max_gated])
+        # a gate that no training ad is below would never skip the classifier
+        if not np.any(green_counts < gate_threshold):
+            return
+        self.gate_class = self.classes_[gate_class_index]
+        self.gate_threshold = gate_threshold
+
+    def fit_streaming(
+        self,
+        train_path,
+        chunk_size=None,
+        n_features=None,
+    ):
+        """Fits the classifier to labelled job ads read from a json lines
+        file in chunks, so that the training set never has to fit in memory.
+
+        Job ads are vectorised with a stateless HashingVectorizer of
+        n_features columns rather than a fitted TF-IDF vocabulary, and the
+        classifier is trained from an XGBoost external memory DMatrix cached
+        on disk. Features are always sparse. Job ads cannot be resampled
+        as they are streamed, so the "smote" and "undersample" imbalance
+        strategies fall back to "sample_weight", weighting job ads by the
+        inverse frequency of their class.
+        chunk_size and n_features default to the streaming_chunk_size and
+        streaming_n_features settings.
+        """
+        import xgboost
+        from sklearn.feature_extraction.text import HashingVectorizer
+        from xgboost import XGBClassifier
+
+        from grjobs import logger
+        from grjobs.pipeline.job_ads_iterator import JobAdsIterator
+
+        settings = get_settings()
+        hyperparameters = self.hyperparameters()
+        chunk_size = chunk_size or settings.streaming_chunk_size
+        n_features = n_features or settings.streaming_n_features
+        self.load_lexicon()
+        self.sparse = True
+        self.vectoriser = HashingVectorizer(
+            n_features=n_features, alternate_sign=False, dtype=np.float32
+        )
+        self.classes_, class_counts = np.unique(
+            [ad["label"] for ad in read_jsonl(train_path)], return_counts=True
+        )
+        # the gate needs every training green count, so streamed models score
+        # every job ad with the full model
+        self.gate_class, self.gate_threshold = None, None
+
+        params = {
+            "max_depth": hyperparameters["max_depth"],
+            "min_child_weight": hyperparameters["min_child_weight"],
+            "tree_method": "hist",
+        }
+        if len(self.classes_) > 2:
+            params.update(objective="multi:softprob", num_class=len(self.classes_))
+        else:
+            params.update(objective="binary:logistic")
+            if self.imbalance_strategy == "scale_pos_weight":
+                params["scale_pos_weight"] = class_counts[0] / class_counts[1]
+
+        imbalance_strategy = self.imbalance_strategy
+        if imbalance_strategy in ("smote", "undersample"):
+            logger.warning(
+                f"The {imbalance_strategy} imbalance strategy cannot be streamed, "
+                f"weighting classes by sample_weight instead"
+            )
+            imbalance_strategy = "sample_weight"
+        class_weights = None
+        if imbalance_strategy == "sample_weight":
+            # the same weights as compute_sample_weight("balanced")
+            class_weights = class_counts.sum() / (len(class_counts) * class_counts)
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            job_ads = JobAdsIterator(
+                self,
+                train_path,
+                chunk_size,
+                os.path.join(cache_dir, "train"),
+                class_weights,
+            )
+            with profiler.stage("green_classifier.build_dmatrix"):
+                train_matrix = xgboost.DMatrix(job_ads)
+            with profiler.stage(
+                "green_classifier.fit_classifier", train_matrix.num_row()
+            ):
+                booster = xgboost.train(
+                    params,
+                    train_matrix,
+                    num_boost_round=hyperparameters["n_estimators"],
+                )
+            # free the external memory cache before its directory is removed
+            del train_matrix, job_ads
+
+        self.classifier = XGBClassifier()
+        self.classifier.load_model(bytearray(booster.save_raw("ubj")))
 
     def transform(self, X):
 
-        X = self.preprocess_text(X)
-        green_counts = np.array(self.preprocess_green_count(X))
-        X_vec = self.vectoriser.transform([t["clean_description"] for t in X]).toarray()
-        X_green_vec = np.hstack((X_vec, green_counts[:, None]))
-        y_pred = self.classifier.predict(X_green_vec)
+        if self.cascade and self.gate_threshold is not None:
+            return self.transform_cascade(X)
+
+        X_green_vec = self.featurise(X)
+        with profiler.stage("green_classifier.predict", len(X)):
+            y_pred = self.classifier.predict(X_green_vec)
+
+        return self.classes_[y_pred]
+
+    def transform_cascade(self, X):
+        """Classifies job ads below the gate threshold as the gate class
+        from their green counts alone, and the rest with the full model."""
+        green_counts = np.asarray(self.preprocess(X))
+        with profiler.stage("green_classifier.gate", len(X)):
+            passed = np.flatnonzero(green_counts >= self.gate_threshold)
+            y_pred = np.full(len(X), self.gate_class, dtype=self.classes_.dtype)
+        if len(passed):
+            passed_ads = [X[i] for i in passed]
+            X_green_vec = self.featurise(passed_ads, green_counts[passed])
+            with profiler.stage("green_classifier.predict", len(passed)):
+                y_pred_passed = self.classifier.predict(X_green_vec)
+            y_pred[passed] = self.classes_[y_pred_passed]
 
         return y_pred
 
@@ -136,25 +501,110 @@ class GreenClassifier:
         return self.transform(X)
 
     def evaluate(self, y, y_pred, verbose=True):
+        from sklearn.metrics import classification_report, confusion_matrix
+
         class_rep = classification_report(y, y_pred, output_dict=True)
         if verbose:
             print(classification_report(y, y_pred))
             print(confusion_matrix(y, y_pred))
         return class_rep
 
-    def save_model(self, file_name):
+    def evaluate_cascade(self, X, y, n_repeats=3):
+        """Scores job ads with and without the cascade, comparing recall of
+        each class and time taken.
+
+        Returns:
+            A dictionary of the fraction of job ads gated, the fraction
+            whose prediction the cascade changes, the recall of each class
+            with full and cascade scoring, the recall loss of the classes
+            other than the gate class, and the speedup of cascade over
+            full scoring.
+
+        Both modes are timed on equal terms: the feature cache is not
+        used, both are run once untimed to warm the lemma cache, then
+        timed n_repeats times in alternating order, keeping the fastest
+        time of each.
+        """
+        import copy
+        import time
+
+        from sklearn.metrics import recall_score
+
+        if self.gate_threshold is None:
+            raise ValueError("GreenClassifier has no cascade gate")
+        cascade, cache_path = self.cascade, self.cache_path
+        # cached features would let whichever mode runs second skip cleaning
+        self.cache_path = None
+        y_preds, seconds = {}, {False: np.inf, True: np.inf}
+        try:
+            for mode in (False, True):
+                self.cascade = mode
+                job_ads = copy.deepcopy(X)
+                y_preds[mode] = self.transform(job_ads)
+            for repeat in range(n_repeats):
+                for mode in (False, True) if repeat % 2 else (True, False):
+                    self.cascade = mode
+                    repeat_job_ads = copy.deepcopy(X)
+                    start = time.perf_counter()
+                    self.transform(repeat_job_ads)
+                    seconds[mode] = min(seconds[mode], time.perf_counter() - start)
+        finally:
+            self.cascade, self.cache_path = cascade, cache_path
+
+        recalls = {
+            mode: dict(
+                zip(
+                    self.classes_.tolist(),
+                    recall_score(
+                        y, y_preds[mode], labels=self.classes_, average=None
+                    ).tolist(),
+                )
+            )
+            for mode in (False, True)
+        }
+        # recall lost on the other classes by gating their job ads
+        y = np.asarray(y)
+        other = y != self.gate_class
+        n_lost = np.sum((y_preds[False] == y) & other) - np.sum(
+            (y_preds[True] == y) & other
+        )
+        green_counts = np.array([ad["green_count"] for ad in job_ads])
+        results = {
+            "gate_class": self.gate_class.item(),
+            "gate_threshold": self.gate_threshold,
+            "gated_fraction": float(np.mean(green_counts < self.gate_threshold)),
+            "changed_fraction": float(np.mean(y_preds[False] != y_preds[True])),
+            "full_recall": recalls[False],
+            "cascade_recall": recalls[True],
+            "recall_loss": float(n_lost / max(other.sum(), 1)),
+            "full_seconds": seconds[False],
+            "cascade_seconds": seconds[True],
+            "speedup": seconds[False] / seconds[True],
+        }
+
+        return results
 
-        model_path = pretrained_model_path + file_name + '.pkl'
+    def save_model(self, file_name):
 
-        with open(model_path, "wb") as f:
-            pickle.dump(self, f)
+        save_model_bundle(self, get_settings().model_output_path / file_name)
 
 # %%
-def load_model(file_name):
-
-    model_path = pretrained_model_path + file_name + '.pkl'
-
-    with open(model_path, "rb") as f:
-        green_model = pickle.load(f)
-
-    return green_model
+def load_model(file_name, **kwargs):
+    """Loads a model saved as a model bundle, with runtime options such as
+    n_jobs given as keyword arguments."""
+
+    model_path = get_settings().model_output_path / file_name
+
+    if model_path.is_dir():
+        return GreenClassifier.from_bundle(ModelBundle(model_path), **kwargs)
+
+    # pickles of earlier versions lack the options and classes_ that
+    # GreenClassifier now scores with, and their classifiers predict labels
+    # rather than class indices
+    if model_path.with_name(file_name + ".pkl").exists():
+        raise ValueError(
+            f"{file_name}.pkl was saved by an earlier version of GreenClassifier "
+            f"and can no longer be loaded, retrain it with train_flow.py to save "
+            f"it as a model bundle"
+        )
+    raise FileNotFoundError(f"No model bundle found at {model_path}")
@@ -4,39 +4,146 @@
 # %%
 """A flow for identifiying job ad descriptions as 'green' or not.
 
+Job ads are read from the source once and dealt in turn into shards, each
+written to a local json lines file as it is read. Each shard is scored in
+parallel, reading only its own file and scoring job ads in fixed-size
+batches as they are read, so no step holds the whole corpus. Predictions
+are merged and saved as a json of ad ID to predicted class, and the shard
+files are deleted. As shards are local files, all steps run on one machine.
+
 Typical usage example:
 
     python grjobs/pipeline/green_classifier_flow.py run
 
+    or, to score job ads from a local json or json lines file:
+
+    python grjobs/pipeline/green_classifier_flow.py run --ads_path job_ads.jsonl
+
 """
 # ---------------------------------------------------------------------------------
 import json
 import pickle
+import shutil
 import datetime
+import tempfile
+from contextlib import ExitStack
+from itertools import islice
 # %%
-from metaflow import FlowSpec, step, batch, retry
+import grjobs
+
+# BUCKET and METAFLOW_PROFILE, which metaflow reads on import
+grjobs.load_env()
+from metaflow import FlowSpec, Parameter, step, batch, retry
 
 # %%
-from grjobs import get_yaml_config, Path, PROJECT_DIR
-from ojd_daps.dqa.data_getters import get_db_job_ads
+from grjobs.settings import get_settings
 from grjobs.pipeline.green_classifier import load_model
+from grjobs.pipeline.green_count import read_jsonl
 # ---------------------------------------------------------------------------------
-# load config file
-grjobs_config = get_yaml_config(Path(str(PROJECT_DIR) + "/grjobs/config/base.yaml"))
+# load settings, overridden by GRJOBS_ environment variables
+settings = get_settings()
+
+
+def iter_job_ads(ads_path=None, limit=None):
+    """Yields job ads one at a time from a local json or json lines file if
+    ads_path is given, otherwise from the job ads database."""
+    if not ads_path:
+        from ojd_daps.dqa.data_getters import get_db_job_ads
+
+        jobs = get_db_job_ads(limit=limit, return_features=True)
+    elif ads_path.endswith(".jsonl"):
+        jobs = islice(read_jsonl(ads_path), limit)
+    else:
+        with open(ads_path) as f:
+            jobs = json.load(f)[:limit]
+
+    for job in jobs:
+        if job["description"] != "[]":
+            yield job
+
+
+def shard_job_ads(jobs, shard_dir, n_shards):
+    """Deals job ads in turn into n_shards json lines files in shard_dir,
+    writing each job ad as it is read.
+
+    Returns:
+        A list of the paths of the shard files holding at least one job ad
+        and the number of job ads written.
+    """
+    shard_paths = [f"{shard_dir}/shard_{i}.jsonl" for i in range(n_shards)]
+    n_jobs = 0
+    with ExitStack() as stack:
+        shard_files = [stack.enter_context(open(path, "w")) for path in shard_paths]
+        for n_jobs, job in enumerate(jobs, 1):
+            # database rows may hold dates, which are not json serialisable
+            shard_files[(n_jobs - 1) % n_shards].write(
+                json.dumps(job, default=str) + "\n"
+            )
+
+    return shard_paths[: min(n_jobs, n_shards)], n_jobs
+
 
 class GreenFlow(FlowSpec):
-    
+
+    model_name = Parameter(
+        "model_name", help="name of the saved model to apply", default="best_model"
+    )
+    ads_path = Parameter(
+        "ads_path",
+        help="local json or json lines file of job ads, instead of the database",
+        default="",
+    )
+    limit = Parameter(
+        "limit", help="maximum number of job ads to classify", default=None, type=int
+    )
+    n_shards = Parameter(
+        "n_shards",
+        help="number of shards scored in parallel",
+        default=settings.n_shards,
+        type=int,
+    )
+    batch_size = Parameter(
+        "batch_size",
+        help="number of job ads scored per model call",
+        default=settings.batch_size,
+        type=int,
+    )
+
     @step
     def start(self):
-        self.model = load_model('best_model')
-        print('loaded model!')
-        self.next(self.apply_model)
+        self.shard_dir = tempfile.mkdtemp(prefix="grjobs_shards_")
+        shard_paths, n_jobs = shard_job_ads(
+            iter_job_ads(self.ads_path, self.limit), self.shard_dir, self.n_shards
+        )
+        # foreach needs at least one shard, even if it scores no job ads
+        self.shards = shard_paths or [None]
+        print(f'split {n_jobs} jobs into {len(shard_paths)} shards!')
+        self.next(self.apply_model, foreach="shards")
 
     @step
     def apply_model(self):
-        jobs = [job for job in get_db_job_ads(limit = 100, return_features = True) if job['description'] != '[]']
-        y_pred = self.model.predict(jobs)
-        print('100 jobs classified!')
+        model = load_model(self.model_name)
+        self.predictions = {}
+        if self.input is not None:
+            jobs = read_jsonl(self.input)
+            for job_batch in iter(lambda: list(islice(jobs, self.batch_size)), []):
+                y_pred = model.predict(job_batch)
+                self.predictions.update(
+                    zip([job["id"] for job in job_batch], y_pred.tolist())
+                )
+        print(f'{len(self.predictions)} jobs classified!')
+        self.next(self.join)
+
+    @step
+    def join(self, inputs):
+        self.predictions = {}
+        for shard in inputs:
+            self.predictions.update(shard.predictions)
+        shutil.rmtree(inputs[0].shard_dir, ignore_errors=True)
+
+        with open(settings.pred_output_path / "green_predictions.json", "w") as f:
+            json.dump(self.predictions, f)
+        print(f'merged {len(self.predictions)} predictions!')
         self.next(self.end)
 
     @step
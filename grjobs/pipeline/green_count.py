@@ -3,37 +3,49 @@
 """Module for adding 'green' count feature to jobs description data.
 """
 # ---------------------------------------------------------------------------------
-import boto3
 import json
-import pickle
 import collections
+import hashlib
+import numpy as np
 
 from functools import lru_cache
-from nltk.tokenize import word_tokenize
+from itertools import accumulate
 
 #from ojd_daps.dqa.data_getters import get_db_job_ads
-from grjobs.utils.text_cleaning_utils import clean_text
+from grjobs.utils.text_cleaning_utils import clean_text, word_tokenize
 
 # ---------------------------------------------------------------------------------
 
-S3_PATH = "labs/green-jobs/{}"
-BUCKET_NAME = "open-jobs-lake"
-
-@lru_cache(maxsize=None)
 def load_from_s3(filename):
-    """Loads the file contents from the filename at {BUCKET_NAME}/{S3_PATH}"""
-    s3 = boto3.client("s3")
-    obj = s3.get_object(Bucket=BUCKET_NAME, Key=S3_PATH.format(filename))
-    return obj["Body"].read().decode()
+    """Loads the file contents from the filename in the project's object store"""
+    from grjobs.utils.storage import get_object_store
+
+    return get_object_store().read_text(filename)
 
 def load_json_from_s3(prefix="final_training_set"):
-    """Save data as json from S3"""
-    return json.loads(load_from_s3(f"{prefix}.json"))
+    """Load data as json from S3"""
+    from grjobs.utils.storage import get_object_store
+
+    return get_object_store().load_json(f"{prefix}.json")
+
+def iter_json_from_s3(prefix="final_training_set"):
+    """Yields records of a json array from S3 one at a time"""
+    from grjobs.utils.storage import get_object_store
 
-def load_pkl_from_s3(prefix="green_jobs_output"): 
-    """Save data as pickle from S3"""
-    s3 = boto3.resource("s3")
-    return pickle.loads(s3.Bucket(BUCKET_NAME).Object(S3_PATH.format(f"{prefix}.pkl")).get()['Body'].read())
+    return get_object_store().iter_json(f"{prefix}.json")
+
+def load_pkl_from_s3(prefix="green_jobs_output"):
+    """Load data as pickle from S3"""
+    from grjobs.utils.storage import get_object_store
+
+    return get_object_store().load_pickle(f"{prefix}.pkl")
+
+def read_jsonl(file_path):
+    """Yields records from a local json lines file one at a time"""
+    with open(file_path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
 
 def green_count(text, green_words):
     """Counts number of any green terms or phrases per
@@ -63,3 +75,185 @@ def green_count(text, green_words):
             green_counts.append(text_tokenised.count(green_word) / text_length)
 
     return sum(green_counts)
+
+
+class GreenLexicon:
+    """Compiled green word and phrase matcher.
+
+    Built once from a list of green terms, it counts every single
+    word and multi-word term in one pass over a job description
+    rather than scanning the description once per term. Scores
+    match green_count: single words are counted against the
+    tokenised text and phrases are counted as non-overlapping
+    substrings of the text.
+
+    Attributes:
+        terms: list of unique green terms
+        weights: number of times each term appears in the green list
+        version: hash of the terms and weights
+    """
+
+    def __init__(self, green_words):
+        self.terms = []
+        self.weights = []
+        term_index = {}
+        word_index = {}
+        phrase_index = collections.defaultdict(list)
+
+        for green_word in green_words:
+            if green_word in term_index:
+                self.weights[term_index[green_word]] += 1
+                continue
+            idx = term_index[green_word] = len(self.terms)
+            self.terms.append(green_word)
+            self.weights.append(1)
+
+            words = green_word.split(" ")
+            if len(words) > 1:
+                phrase_index[words[0]].append(
+                    (idx, tuple(words[1:-1]), words[-1], len(green_word))
+                )
+            else:
+                word_index[green_word] = idx
+
+        self.version = hashlib.sha256(
+            json.dumps([self.terms, self.weights]).encode()
+        ).hexdigest()
+        self.word_index = word_index
+        self.phrase_index = dict(phrase_index)
+        # first words of phrases may match the end of a longer token
+        # ("low carbon" is found in "yellow carbon") so keep their lengths
+        # to look up every possible suffix of a candidate token
+        self.first_word_lengths = sorted({len(word) for word in phrase_index})
+        self.first_words = tuple(word for word in phrase_index if word)
+        self.match_any_token = "" in phrase_index
+
+    def term_counts(self, text):
+        """Counts occurrences of each green term in text.
+
+        Returns:
+            A dictionary of term index to count and the number
+            of tokens in the text.
+        """
+        text_tokenised = word_tokenize(text)
+        token_counts = collections.Counter(text_tokenised)
+        counts = {
+            self.word_index[token]: token_counts[token]
+            for token in token_counts.keys() & self.word_index.keys()
+        }
+        if self.phrase_index:
+            self._count_phrases(text, counts)
+
+        return counts, len(text_tokenised)
+
+    def _count_phrases(self, text, counts):
+        """Adds non-overlapping phrase occurrences in text to counts."""
+        pieces = text.split(" ")
+        if self.match_any_token:
+            candidates = range(len(pieces) - 1)
+        else:
+            candidates = [
+                i
+                for i, piece in enumerate(pieces[:-1])
+                if piece.endswith(self.first_words)
+            ]
+        if not candidates:
+            return
+
+        boundaries = list(accumulate(len(piece) + 1 for piece in pieces))
+        last_ends = {}
+        for i in candidates:
+            piece = pieces[i]
+            boundary = boundaries[i] - 1
+            for length in self.first_word_lengths:
+                if length > len(piece):
+                    break
+                for idx, middle, last, term_length in self.phrase_index.get(
+                    piece[len(piece) - length :], ()
+                ):
+                    j = i + 1 + len(middle)
+                    if j >= len(pieces) or not pieces[j].startswith(last):
+                        continue
+                    if middle and tuple(pieces[i + 1 : j]) != middle:
+                        continue
+                    start = boundary - length
+                    if start < last_ends.get(idx, 0):
+                        continue
+                    last_ends[idx] = start + term_length
+                    counts[idx] = counts.get(idx, 0) + 1
+
+    def count(self, text):
+        """Returns the green count 'score' of a cleaned job description.
+
+        Equivalent to green_count(text, green_words) for the green
+        words the lexicon was built from.
+        """
+        counts, text_length = self.term_counts(text)
+        if not counts:
+            return 0.0
+
+        return (
+            sum(self.weights[idx] * count for idx, count in counts.items())
+            / text_length
+        )
+
+    def count_matrix(self, texts):
+        """Counts green terms across a corpus of cleaned job descriptions.
+
+        Returns:
+            A sparse CSR matrix of term counts with one row per text
+            and one column per green term, and an array of the number
+            of tokens in each text.
+        """
+        from scipy import sparse
+
+        indptr = [0]
+        indices = []
+        data = []
+        text_lengths = []
+        for text in texts:
+            counts, text_length = self.term_counts(text)
+            indices.extend(counts.keys())
+            data.extend(counts.values())
+            indptr.append(len(indices))
+            text_lengths.append(text_length)
+
+        count_matrix = sparse.csr_matrix(
+            (
+                np.array(data, dtype=np.int32),
+                np.array(indices, dtype=np.int32),
+                np.array(indptr, dtype=np.int64),
+            ),
+            shape=(len(text_lengths), len(self.terms)),
+        )
+
+        return count_matrix, np.array(text_lengths, dtype=np.int64)
+
+    def transform(self, texts):
+        """Returns green count 'scores' for a corpus of cleaned job descriptions.
+
+        The term count matrix is weighted by the number of times each
+        term appears in the green list and normalised by text length.
+
+        Returns:
+            A float32 array with one green count score per text.
+        """
+        count_matrix, text_lengths = self.count_matrix(texts)
+        green_counts = count_matrix @ np.array(self.weights, dtype=np.float64)
+        green_counts = np.divide(
+            green_counts,
+            text_lengths,
+            out=np.zeros(len(text_lengths)),
+            where=text_lengths > 0,
+        )
+
+        return green_counts.astype(np.float32)
+
+
+@lru_cache(maxsize=None)
+def load_green_lexicon(file_path):
+    """Loads and compiles the green words list at file_path once per process."""
+    with open(file_path) as f:
+        green_words = [word for word in f.read().split("\n") if word != ""]
+
+    return GreenLexicon(green_words)
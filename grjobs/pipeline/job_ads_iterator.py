@@ -0,0 +1,53 @@
+# File: pipeline/job_ads_iterator.py
+
+"""Module for streaming labelled job ads into an XGBoost external memory DMatrix.
+
+Kept apart from green_classifier, which only imports XGBoost when it is
+first used, as the iterator must subclass xgboost.DataIter.
+"""
+# ---------------------------------------------------------------------------------
+import numpy as np
+import xgboost
+from itertools import islice
+
+from grjobs.pipeline.green_count import read_jsonl
+
+# ---------------------------------------------------------------------------------
+
+
+class JobAdsIterator(xgboost.DataIter):
+    """
+    Reads, cleans and vectorises chunks of labelled job ads from a json
+    lines file for XGBoost to build an external memory DMatrix from.
+
+    Attributes:
+        model: GreenClassifier whose vectoriser and classes are used
+        train_path: path to the json lines file of labelled job ads
+        chunk_size: number of job ads read at a time
+        class_weights: array of the weight of each encoded class, or None
+            to weight job ads equally
+    """
+
+    def __init__(self, model, train_path, chunk_size, cache_prefix, class_weights=None):
+        self.model = model
+        self.train_path = train_path
+        self.chunk_size = chunk_size
+        self.class_weights = class_weights
+        self.class_index = {label: i for i, label in enumerate(model.classes_)}
+        self.job_ads = read_jsonl(train_path)
+        super().__init__(cache_prefix=cache_prefix)
+
+    def next(self, input_data):
+        job_ads = list(islice(self.job_ads, self.chunk_size))
+        if not job_ads:
+            return False
+        labels = np.array([self.class_index[ad["label"]] for ad in job_ads])
+        input_data(
+            data=self.model.featurise(job_ads),
+            label=labels,
+            weight=None if self.class_weights is None else self.class_weights[labels],
+        )
+        return True
+
+    def reset(self):
+        self.job_ads = read_jsonl(self.train_path)
@@ -0,0 +1,182 @@
+# File: pipeline/model_bundle.py
+
+"""Module for saving and loading GreenClassifier models as versioned bundles.
+
+A model bundle is a directory holding:
+
+    manifest.json: bundle format version, feature settings, classes, the
+    vectoriser's transform parameters and the cascade gate, if any
+    booster.ubj: the XGBoost booster in its native UBJSON format
+    vocabulary.npy, idf.npy: the TF-IDF vocabulary, in column order, and
+    inverse document frequencies, unless the model was fit with a
+    stateless HashingVectorizer
+    lexicon.json: the green lexicon terms and weights
+
+Unlike a pickle, a bundle does not depend on the imblearn pipeline or the
+sampler used in training and can be read across library versions. Only
+the manifest and lexicon are read when a bundle is loaded. The vectoriser
+and booster, and scikit-learn and XGBoost themselves, are loaded on first
+use, with the IDF vector memory-mapped.
+"""
+# ---------------------------------------------------------------------------------
+import json
+import datetime
+import numpy as np
+from pathlib import Path
+
+from grjobs.pipeline.green_count import GreenLexicon
+
+# ---------------------------------------------------------------------------------
+
+MODEL_BUNDLE_VERSION = 1
+
+# TfidfVectorizer parameters that affect transform, rather than only fit
+VECTORISER_PARAMS = [
+    "input",
+    "encoding",
+    "decode_error",
+    "strip_accents",
+    "lowercase",
+    "token_pattern",
+    "ngram_range",
+    "analyzer",
+    "binary",
+    "norm",
+    "use_idf",
+    "smooth_idf",
+    "sublinear_tf",
+]
+
+# HashingVectorizer parameters, all of which affect transform
+HASHING_VECTORISER_PARAMS = [
+    "input",
+    "encoding",
+    "decode_error",
+    "strip_accents",
+    "lowercase",
+    "token_pattern",
+    "ngram_range",
+    "analyzer",
+    "n_features",
+    "binary",
+    "norm",
+    "alternate_sign",
+]
+
+
+def save_model_bundle(model, bundle_path):
+    """Saves a fitted GreenClassifier as a model bundle at bundle_path."""
+    import sklearn
+    import xgboost
+    from sklearn.feature_extraction.text import HashingVectorizer
+
+    bundle_path = Path(bundle_path)
+    bundle_path.mkdir(parents=True, exist_ok=True)
+
+    vectoriser = model.vectoriser
+    if isinstance(vectoriser, HashingVectorizer):
+        vectoriser_type = "hashing"
+        vectoriser_param_names = HASHING_VECTORISER_PARAMS
+        # remove the vocabulary of a TF-IDF model previously saved here
+        for file_name in ("vocabulary.npy", "idf.npy"):
+            (bundle_path / file_name).unlink(missing_ok=True)
+    else:
+        vectoriser_type = "tfidf"
+        vectoriser_param_names = VECTORISER_PARAMS
+        vocabulary = sorted(vectoriser.vocabulary_, key=vectoriser.vocabulary_.get)
+        np.save(bundle_path / "vocabulary.npy", np.array(vocabulary, dtype=str))
+        np.save(bundle_path / "idf.npy", np.asarray(vectoriser.idf_))
+
+    # the fitted model may be the training pipeline or a bare classifier
+    classifier = getattr(model.classifier, "steps", [(None, model.classifier)])[-1][1]
+    classifier.save_model(bundle_path / "booster.ubj")
+
+    with open(bundle_path / "lexicon.json", "w") as f:
+        json.dump(
+            {"terms": model.green_lexicon.terms, "weights": model.green_lexicon.weights},
+            f,
+        )
+
+    vectoriser_params = vectoriser.get_params()
+    manifest = {
+        "format_version": MODEL_BUNDLE_VERSION,
+        "created": datetime.datetime.now().isoformat(),
+        "sklearn_version": sklearn.__version__,
+        "xgboost_version": xgboost.__version__,
+        "sparse": model.sparse,
+        "classes": np.asarray(model.classes_).tolist(),
+        "lexicon_version": model.lexicon_version,
+        "vectoriser": {
+            "type": vectoriser_type,
+            "params": {name: vectoriser_params[name] for name in vectoriser_param_names},
+            "dtype": np.dtype(vectoriser_params["dtype"]).name,
+        },
+    }
+    if model.gate_threshold is not None:
+        manifest["gate"] = {
+            "class_index": int(np.flatnonzero(model.classes_ == model.gate_class)[0]),
+            "threshold": model.gate_threshold,
+        }
+    with open(bundle_path / "manifest.json", "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+class ModelBundle:
+    """
+    Reader for a model bundle saved by save_model_bundle.
+
+    Attributes:
+        bundle_path: path to the bundle directory
+        manifest: the bundle's manifest
+    """
+
+    def __init__(self, bundle_path):
+        self.bundle_path = Path(bundle_path)
+        with open(self.bundle_path / "manifest.json") as f:
+            self.manifest = json.load(f)
+        if self.manifest["format_version"] > MODEL_BUNDLE_VERSION:
+            raise ValueError(
+                f"Model bundle format version {self.manifest['format_version']} "
+                f"is newer than the supported version {MODEL_BUNDLE_VERSION}"
+            )
+
+    def load_green_lexicon(self):
+        """Compiles the bundled green lexicon."""
+        with open(self.bundle_path / "lexicon.json") as f:
+            lexicon = json.load(f)
+        green_words = [
+            term
+            for term, weight in zip(lexicon["terms"], lexicon["weights"])
+            for _ in range(weight)
+        ]
+        green_lexicon = GreenLexicon(green_words)
+        if green_lexicon.version != self.manifest["lexicon_version"]:
+            raise ValueError("Bundled green lexicon does not match its version hash")
+
+        return green_lexicon
+
+    def load_vectoriser(self):
+        """Rebuilds the fitted vectoriser, memory-mapping the TF-IDF IDF."""
+        from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+
+        vectoriser_manifest = self.manifest["vectoriser"]
+        params = dict(vectoriser_manifest["params"])
+        params["ngram_range"] = tuple(params["ngram_range"])
+        dtype = np.dtype(vectoriser_manifest["dtype"]).type
+        if vectoriser_manifest.get("type", "tfidf") == "hashing":
+            return HashingVectorizer(dtype=dtype, **params)
+
+        vocabulary = np.load(self.bundle_path / "vocabulary.npy").tolist()
+        vectoriser = TfidfVectorizer(vocabulary=vocabulary, dtype=dtype, **params)
+        vectoriser.idf_ = np.load(self.bundle_path / "idf.npy", mmap_mode="r")
+
+        return vectoriser
+
+    def load_classifier(self):
+        """Loads the XGBoost classifier from its native booster file."""
+        from xgboost import XGBClassifier
+
+        classifier = XGBClassifier()
+        classifier.load_model(self.bundle_path / "booster.ubj")
+
+        return classifier
@@ -0,0 +1,315 @@
+# File: pipeline/scoring_service.py
+
+"""A micro-batching HTTP service for classifying job ads as 'green' or not.
+
+Concurrent requests to score single job ads are queued and grouped into
+batches, each scored with one GreenClassifier.predict call. A batch is
+scored once it reaches the maximum batch size or once its first ad has
+waited the maximum wait time, which bounds latency under light load
+while keeping throughput high under heavy load.
+
+Endpoints:
+
+    POST /predict: score one job ad, sent as json with job_title_raw and
+    description keys. Returns {"label": predicted class}.
+    GET /metrics: request latency percentiles and batch size statistics.
+    GET /health: service status.
+
+Typical usage example:
+
+    python grjobs/pipeline/scoring_service.py --set service_port=8080 --set service_max_batch_size=128
+
+    or, with any other ASGI server:
+
+    uvicorn grjobs.pipeline.scoring_service:app
+
+"""
+# ---------------------------------------------------------------------------------
+import json
+import time
+import asyncio
+from collections import Counter, deque
+
+import numpy as np
+
+from grjobs import logger
+from grjobs.settings import get_settings
+from grjobs.pipeline.green_classifier import load_model
+
+# ---------------------------------------------------------------------------------
+# number of recent request latencies kept for percentiles
+LATENCY_WINDOW = 10000
+
+
+class ScoringMetrics:
+    """
+    Latency and batch size metrics of the scoring service.
+
+    Attributes:
+        latencies: latencies in seconds of the most recent requests
+        batch_sizes: counter of scored batch sizes
+    """
+
+    def __init__(self, latency_window=LATENCY_WINDOW):
+        self.latencies = deque(maxlen=latency_window)
+        self.batch_sizes = Counter()
+        self.n_requests = 0
+        self.n_errors = 0
+
+    def summary(self):
+        """Returns metrics as a json-serialisable dictionary."""
+        n_batches = sum(self.batch_sizes.values())
+        summary = {
+            "requests": self.n_requests,
+            "errors": self.n_errors,
+            "batches": n_batches,
+            "mean_batch_size": (
+                sum(size * count for size, count in self.batch_sizes.items())
+                / n_batches
+                if n_batches
+                else 0
+            ),
+            "batch_sizes": {
+                str(size): count for size, count in sorted(self.batch_sizes.items())
+            },
+        }
+        if self.latencies:
+            latencies_ms = np.array(self.latencies) * 1000
+            for percentile in (50, 90, 95, 99):
+                summary[f"latency_p{percentile}_ms"] = float(
+                    np.percentile(latencies_ms, percentile)
+                )
+            summary["latency_max_ms"] = float(latencies_ms.max())
+
+        return summary
+
+
+class MicroBatcher:
+    """
+    Groups concurrently submitted job ads into batches for one predict call.
+
+    Attributes:
+        predict: function scoring a list of job ads
+        max_batch_size: maximum number of job ads per batch
+        max_wait_ms: maximum time a batch waits for more job ads
+        metrics: ScoringMetrics updated with each scored batch
+    """
+
+    def __init__(self, predict, max_batch_size, max_wait_ms, metrics):
+        self.predict = predict
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.metrics = metrics
+        self.queue = asyncio.Queue()
+
+    async def submit(self, job_ad):
+        """Queues a job ad and waits for its predicted class."""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((job_ad, future))
+        return await future
+
+    async def next_batch(self):
+        """Waits for a job ad, then collects more until the batch is full
+        or the maximum wait time has passed."""
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def run(self):
+        """Scores batches of queued job ads until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self.next_batch()
+            job_ads = [job_ad for job_ad, _ in batch]
+            try:
+                # score in a worker thread so that requests keep being queued
+                labels = await loop.run_in_executor(None, self.predict, job_ads)
+            except Exception as e:
+                logger.exception("Failed to score batch")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.metrics.batch_sizes[len(batch)] += 1
+            for (_, future), label in zip(batch, np.asarray(labels).tolist()):
+                if not future.done():
+                    future.set_result(label)
+
+
+async def read_body(receive):
+    """Reads the full body of an HTTP request."""
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+    return body
+
+
+async def send_json(send, status, content):
+    """Sends a json HTTP response."""
+    body = json.dumps(content).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+class ScoringService:
+    """
+    ASGI application scoring job ads with a GreenClassifier.
+
+    The model is loaded, and batches start being scored, on ASGI lifespan
+    startup or on the first request.
+
+    Attributes:
+        model_name: name of the saved model to load, the service_model
+            setting if None
+        max_batch_size: maximum number of job ads per batch, the
+            service_max_batch_size setting if None
+        max_wait_ms: maximum time a batch waits for more job ads, the
+            service_max_wait_ms setting if None
+        model: a fitted GreenClassifier, loaded from model_name if None
+    """
+
+    def __init__(
+        self,
+        model_name=None,
+        max_batch_size=None,
+        max_wait_ms=None,
+        model=None,
+    ):
+        self.model_name = model_name
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.model = model
+        self.metrics = ScoringMetrics()
+        self.batcher = None
+        self.batcher_task = None
+
+    def start(self):
+        # unset options are read from the settings on startup, so that
+        # they can be overridden after the service is created
+        settings = get_settings()
+        if self.model_name is None:
+            self.model_name = settings.service_model
+        if self.max_batch_size is None:
+            self.max_batch_size = settings.service_max_batch_size
+        if self.max_wait_ms is None:
+            self.max_wait_ms = settings.service_max_wait_ms
+        if self.model is None:
+            self.model = load_model(self.model_name)
+        self.batcher = MicroBatcher(
+            self.model.predict, self.max_batch_size, self.max_wait_ms, self.metrics
+        )
+        self.batcher_task = asyncio.get_running_loop().create_task(self.batcher.run())
+
+    def stop(self):
+        if self.batcher_task is not None:
+            self.batcher_task.cancel()
+            self.batcher_task = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self.handle(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    self.start()
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.stop()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def handle(self, scope, receive, send):
+        route = (scope["method"], scope["path"])
+        if route == ("GET", "/health"):
+            await send_json(send, 200, {"status": "ok"})
+        elif route == ("GET", "/metrics"):
+            await send_json(send, 200, self.metrics.summary())
+        elif route == ("POST", "/predict"):
+            await self.predict(receive, send)
+        else:
+            await send_json(send, 404, {"error": "not found"})
+
+    async def predict(self, receive, send):
+        start = time.perf_counter()
+        self.metrics.n_requests += 1
+        try:
+            job_ad = json.loads(await read_body(receive))
+            job_ad = {
+                "job_title_raw": str(job_ad["job_title_raw"]),
+                "description": str(job_ad["description"]),
+            }
+        except (ValueError, KeyError, TypeError):
+            self.metrics.n_errors += 1
+            await send_json(
+                send,
+                400,
+                {"error": "expected json with job_title_raw and description keys"},
+            )
+            return
+
+        if self.batcher_task is None:
+            self.start()
+        try:
+            label = await self.batcher.submit(job_ad)
+        except Exception:
+            self.metrics.n_errors += 1
+            await send_json(send, 500, {"error": "failed to score job ad"})
+            return
+
+        self.metrics.latencies.append(time.perf_counter() - start)
+        await send_json(send, 200, {"label": label})
+
+
+app = ScoringService()
+
+# %%
+if __name__ == "__main__":
+    import argparse
+
+    import uvicorn
+
+    from grjobs.settings import configure, parse_overrides
+
+    parser = argparse.ArgumentParser(description="Serve green job ad predictions.")
+    parser.add_argument(
+        "--set",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="override a setting from grjobs/config/base.yaml, e.g. service_port=8080",
+    )
+    settings = configure(parse_overrides(parser.parse_args().set))
+
+    uvicorn.run(app, host=settings.service_host, port=settings.service_port)
@@ -3,46 +3,167 @@
 """A flow for training the model to predict job ad descriptions as 'green' or not.
 
 Typical usage example:
-    
+
     python grjobs/pipeline/train_flow.py run
-    
+
+    or, to train on labelled job ads too large to fit in memory:
+
+    python grjobs/pipeline/train_flow.py run --train_path train.jsonl --test_path test.jsonl
+
+    or, to tune hyperparameters by cross-validation before training:
+
+    python grjobs/pipeline/train_flow.py run --tune True --n_candidates 8
+
+When tuning, the training set is cleaned and its terms counted once, and
+every candidate and fold is scored in parallel on these shared features.
+
 """
 # ---------------------------------------------------------------------------------
-from metaflow import FlowSpec, step
+from itertools import islice
+
+import grjobs
+
+# BUCKET and METAFLOW_PROFILE, which metaflow reads on import
+grjobs.load_env()
+from metaflow import FlowSpec, Parameter, step
 
 from grjobs.pipeline.green_classifier import GreenClassifier
+from grjobs.pipeline.tuning import TrainingFeatures, parameter_grid, select_best
+from grjobs.settings import get_settings
 
 from grjobs.getters.keywords import get_expanded_green_words
-from grjobs.pipeline.green_count import load_json_from_s3
+from grjobs.pipeline.green_count import load_json_from_s3, read_jsonl
 # ---------------------------------------------------------------------------------
+# load settings, overridden by GRJOBS_ environment variables
+settings = get_settings()
 
 class TrainGreenFlow(FlowSpec):
-    
+
+    train_path = Parameter(
+        "train_path",
+        help="json lines file of labelled job ads to train on in chunks",
+        default="",
+    )
+    test_path = Parameter(
+        "test_path",
+        help="json lines file of labelled job ads to evaluate a streamed model on",
+        default="",
+    )
+    tune = Parameter(
+        "tune",
+        help="tune hyperparameters by cross-validation before training",
+        default=False,
+        type=bool,
+    )
+    n_candidates = Parameter(
+        "n_candidates",
+        help="number of candidates sampled from the tuning grid, 0 for all",
+        default=settings.tuning_n_candidates,
+        type=int,
+    )
+    n_folds = Parameter(
+        "n_folds",
+        help="number of cross-validation folds candidates are scored on",
+        default=settings.tuning_n_folds,
+        type=int,
+    )
+
     @step
     def start(self):
-        self.labelled_data = load_json_from_s3('new_training_data') 
-        self.model = GreenClassifier() 
+        if not self.train_path:
+            self.labelled_data = load_json_from_s3('new_training_data')
+        self.model = GreenClassifier()
         print('instantiated green class!')
         self.next(self.split_data)
 
     @step
     def split_data(self):
-        self.X_train, self.X_test, self.y_train, self.y_test = self.model.split_data(
-            self.labelled_data, 0.1, verbose=True)
-        print('split training data!')
+        if self.train_path:
+            print('streaming training data, using test_path as test data!')
+        else:
+            self.X_train, self.X_test, self.y_train, self.y_test = self.model.split_data(
+                self.labelled_data, 0.1, verbose=True)
+            print('split training data!')
+        self.next(self.featurise)
+
+    @step
+    def featurise(self):
+        # foreach needs at least one task, which does nothing unless tuning
+        self.tasks = [None]
+        if self.tune:
+            if self.train_path:
+                raise ValueError("tuning needs training data that fits in memory")
+            seed = self.model.split_random_seed
+            self.features = TrainingFeatures.from_job_ads(
+                self.model, self.X_train, self.y_train
+            )
+            self.folds = self.features.folds(self.n_folds, seed)
+            candidates = parameter_grid(
+                n_candidates=self.n_candidates, random_seed=seed
+            )
+            self.tasks = [
+                (candidate_index, params, fold_index)
+                for candidate_index, params in enumerate(candidates)
+                for fold_index in range(len(self.folds))
+            ]
+            print(f'scoring {len(candidates)} candidates on {len(self.folds)} folds!')
+        self.next(self.score_candidate, foreach="tasks")
+
+    @step
+    def score_candidate(self):
+        self.candidate = self.input
+        if self.candidate is not None:
+            candidate_index, params, fold_index = self.candidate
+            train_rows, valid_rows = self.folds[fold_index]
+            self.score = self.features.score(
+                self.model, params, train_rows, valid_rows
+            )
+            print(f'candidate {candidate_index}, fold {fold_index}: {self.score:.3f}')
+        self.next(self.select_model)
+
+    @step
+    def select_model(self, inputs):
+        self.merge_artifacts(inputs, exclude=["candidate", "score"])
+        if self.tune:
+            best_params, self.tuning_results = select_best(
+                [(*task.candidate[:2], task.score) for task in inputs]
+            )
+            self.model.params.update(best_params)
+            print(f'selected {best_params}!')
         self.next(self.fit_model)
 
     @step
     def fit_model(self):
-        self.model.fit(self.X_train, self.y_train)
-        self.predictions = self.model.predict(self.X_test)
+        if self.train_path:
+            self.model.fit_streaming(self.train_path)
+            self.y_test, self.predictions = [], []
+            test_ads = read_jsonl(self.test_path) if self.test_path else iter([])
+            for chunk in iter(lambda: list(islice(test_ads, self.model.chunk_size)), []):
+                self.y_test.extend(ad["label"] for ad in chunk)
+                self.predictions.extend(self.model.predict(chunk))
+        elif self.tune:
+            # fit the selected candidate without cleaning the training set again
+            self.features.fit(self.model)
+            self.predictions = self.model.predict(self.X_test)
+        else:
+            self.model.fit(self.X_train, self.y_train)
+            self.predictions = self.model.predict(self.X_test)
         print('made predictions!')
         self.next(self.evaluate)
 
     @step
     def evaluate(self):
-        green_class_results = self.model.evaluate(self.y_test, self.predictions, verbose = True)
-        print('evaluated model!')
+        if self.y_test:
+            green_class_results = self.model.evaluate(self.y_test, self.predictions, verbose = True)
+            if self.model.gate_threshold is not None:
+                self.cascade_results = self.model.evaluate_cascade(self.X_test, self.y_test)
+                print(
+                    f"cascade gated {self.cascade_results['gated_fraction']:.1%} of job ads, "
+                    f"changing {self.cascade_results['changed_fraction']:.1%} of predictions, "
+                    f"{self.cascade_results['speedup']:.2f}x faster with "
+                    f"{self.cascade_results['recall_loss']:.2%} recall loss"
+                )
+            print('evaluated model!')
         self.next(self.save)
 
     @step
@@ -0,0 +1,257 @@
+# File: pipeline/tuning.py
+
+"""Module for tuning GreenClassifier hyperparameters on shared features.
+
+Training job ads are cleaned and their green terms counted once, then kept
+as TrainingFeatures: a sparse matrix of term counts over every term in the
+training set, the green counts and the labels. Each candidate's TF-IDF
+features for a fold are derived from the term counts of the fold's rows,
+keeping the terms within the candidate's min_df and max_df, so that text
+is never cleaned again while candidates are scored. The best candidate
+is then fit on all the training features.
+
+  Typical usage example:
+
+  features = TrainingFeatures.from_job_ads(model, X_train, y_train)
+  folds = features.folds(n_folds=3)
+  scores = [
+    features.score(model, params, train_rows, valid_rows)
+    for params in parameter_grid()
+    for train_rows, valid_rows in folds
+  ]
+
+"""
+# ---------------------------------------------------------------------------------
+import random
+import itertools
+
+import numpy as np
+
+from grjobs.settings import get_settings
+from grjobs.utils.profiling import profiler
+
+# ---------------------------------------------------------------------------------
+# hyperparameters searched when tuning, with their settings of values to search
+TUNED_HYPERPARAMETERS = {
+    "min_df": "tuning_min_df",
+    "max_df": "tuning_max_df",
+    "max_depth": "tuning_max_depth",
+    "min_child_weight": "tuning_min_child_weight",
+}
+
+
+def parameter_grid(grid=None, n_candidates=None, random_seed=42):
+    """Lists the candidate hyperparameters of a grid or random search.
+
+    Args:
+        grid: dictionary of hyperparameter to values searched, from the
+            tuning settings if None
+        n_candidates: number of candidates sampled at random from the
+            grid, the whole grid if 0, from the tuning_n_candidates
+            setting if None
+        random_seed: seed of the random sample of candidates
+
+    Returns:
+        A list of dictionaries of hyperparameter to value.
+    """
+    settings = get_settings()
+    if grid is None:
+        grid = {
+            name: getattr(settings, setting_name)
+            for name, setting_name in TUNED_HYPERPARAMETERS.items()
+        }
+    if n_candidates is None:
+        n_candidates = settings.tuning_n_candidates
+
+    candidates = []
+    for values in itertools.product(*grid.values()):
+        params = dict(zip(grid, values))
+        # no terms can be kept if min_df is above max_df
+        if params.get("min_df", 0) <= params.get("max_df", 1):
+            candidates.append(params)
+    if 0 < n_candidates < len(candidates):
+        candidates = random.Random(random_seed).sample(candidates, n_candidates)
+
+    return candidates
+
+
+class TrainingFeatures:
+    """
+    Cleaned and counted training job ads shared by tuning candidates.
+
+    Attributes:
+        counts: sparse CSR matrix of term counts, one row per job ad and
+            one column per term
+        terms: array of the terms of the columns of counts
+        green_counts: float32 array of green term counts per job ad
+        labels: array of job ad labels
+    """
+
+    def __init__(self, counts, terms, green_counts, labels):
+        self.counts = counts
+        self.terms = terms
+        self.green_counts = green_counts
+        self.labels = labels
+
+    @classmethod
+    def from_job_ads(cls, model, job_ads, labels):
+        """Cleans job ads and counts their terms and green terms with model's
+        text cleaner and green lexicon."""
+        from sklearn.feature_extraction.text import CountVectorizer
+
+        model.load_lexicon()
+        green_counts = model.preprocess(job_ads)
+        # same tokenisation as the TF-IDF vectoriser, keeping every term
+        count_vectoriser = CountVectorizer(dtype=np.int32)
+        with profiler.stage("tuning.count_terms", len(job_ads)):
+            counts = count_vectoriser.fit_transform(
+                [ad["clean_description"] for ad in job_ads]
+            )
+
+        return cls(
+            counts.tocsr(),
+            count_vectoriser.get_feature_names_out(),
+            np.asarray(green_counts, dtype=np.float32),
+            np.asarray(labels),
+        )
+
+    def __len__(self):
+        return self.counts.shape[0]
+
+    def folds(self, n_folds=None, random_seed=42):
+        """Splits the job ads into stratified cross-validation folds.
+
+        Returns:
+            A list of (train_rows, valid_rows) arrays of row indices, with
+            n_folds from the tuning_n_folds setting if None.
+        """
+        from sklearn.model_selection import StratifiedKFold
+
+        n_folds = n_folds or get_settings().tuning_n_folds
+        splitter = StratifiedKFold(
+            n_splits=n_folds, shuffle=True, random_state=random_seed
+        )
+
+        return list(splitter.split(np.zeros(len(self)), self.labels))
+
+    def fit_tfidf(self, rows, min_df, max_df, dtype=np.float64):
+        """Selects the terms of rows within min_df and max_df and fits their
+        IDF, as TfidfVectorizer.fit would on the same job ads.
+
+        Returns:
+            The selected term columns and the fitted TfidfTransformer.
+        """
+        from sklearn.feature_extraction.text import TfidfTransformer
+
+        counts = self.counts[rows]
+        # each term appears at most once per row of a CSR matrix
+        document_frequencies = np.bincount(counts.indices, minlength=counts.shape[1])
+        columns = np.flatnonzero(
+            (document_frequencies >= min_df * len(rows))
+            & (document_frequencies <= max_df * len(rows))
+        )
+        if not len(columns):
+            raise ValueError(
+                f"No terms are kept with min_df={min_df} and max_df={max_df}"
+            )
+        transformer = TfidfTransformer().fit(counts[:, columns].astype(dtype))
+
+        return columns, transformer
+
+    def transform(self, model, rows, columns, transformer, dtype=np.float64):
+        """Returns the TF-IDF and green count features of rows."""
+        X_vec = transformer.transform(self.counts[rows][:, columns].astype(dtype))
+
+        return model.stack_features(X_vec, self.green_counts[rows])
+
+    def fit_classifier(self, model, rows):
+        """Fits model's classifier to the TF-IDF features of rows, with the
+        model's hyperparameters.
+
+        Returns:
+            The selected term columns and the fitted TfidfTransformer.
+        """
+        hyperparameters = model.hyperparameters()
+        dtype = np.float32 if model.sparse else np.float64
+        columns, transformer = self.fit_tfidf(
+            rows, hyperparameters["min_df"], hyperparameters["max_df"], dtype
+        )
+        X_train = self.transform(model, rows, columns, transformer, dtype)
+        model.classes_, y_encoded = np.unique(self.labels, return_inverse=True)
+        model.fit_gate(self.green_counts[rows], y_encoded[rows])
+        model.fit_classifier(X_train, y_encoded[rows])
+
+        return columns, transformer
+
+    def score(self, model, params, train_rows, valid_rows):
+        """Fits a copy of model with params on train_rows, then scores it on
+        valid_rows.
+
+        Returns:
+            The macro-averaged F1 score of the validation predictions.
+        """
+        from sklearn.metrics import f1_score
+
+        candidate = model.__class__(
+            split_random_seed=model.split_random_seed,
+            sparse=model.sparse,
+            green_lexicon=model.green_lexicon,
+            params={**model.params, **params},
+            imbalance_strategy=model.imbalance_strategy,
+        )
+        columns, transformer = self.fit_classifier(candidate, train_rows)
+        dtype = np.float32 if candidate.sparse else np.float64
+        X_valid = self.transform(candidate, valid_rows, columns, transformer, dtype)
+        y_pred = candidate.classes_[candidate.classifier.predict(X_valid)]
+
+        return f1_score(self.labels[valid_rows], y_pred, average="macro")
+
+    def fit(self, model, params=None):
+        """Fits model with params on all the training features, giving it a
+        TF-IDF vectoriser of the selected terms so that it can score new
+        job ads."""
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        model.params.update(params or {})
+        model.load_lexicon()
+        hyperparameters = model.hyperparameters()
+        dtype = np.float32 if model.sparse else np.float64
+        columns, transformer = self.fit_classifier(model, np.arange(len(self)))
+        model.vectoriser = TfidfVectorizer(
+            vocabulary=self.terms[columns].tolist(),
+            min_df=hyperparameters["min_df"],
+            max_df=hyperparameters["max_df"],
+            dtype=dtype,
+        )
+        model.vectoriser.idf_ = transformer.idf_
+
+        return model
+
+
+def select_best(scores):
+    """Picks the candidate with the highest mean score across folds.
+
+    Args:
+        scores: list of (candidate index, params, fold score) tuples
+
+    Returns:
+        The best candidate's params and a list of every candidate's params,
+        mean and standard deviation of scores, best first.
+    """
+    candidate_scores = {}
+    for candidate_index, params, score in scores:
+        candidate_scores.setdefault(candidate_index, (params, []))[1].append(score)
+
+    results = sorted(
+        (
+            {
+                "params": params,
+                "mean_f1": float(np.mean(fold_scores)),
+                "std_f1": float(np.std(fold_scores)),
+            }
+            for _, (params, fold_scores) in sorted(candidate_scores.items())
+        ),
+        key=lambda result: -result["mean_f1"],
+    )
+
+    return results[0]["params"], results
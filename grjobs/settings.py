@@ -0,0 +1,427 @@
+# File: grjobs/settings.py
+
+"""Module for the project's typed, validated settings.
+
+Settings are read once per process from the yaml config files, overridden
+by environment variables and then by per-run overrides, such as command
+line options. Every value is converted to the type declared on its
+settings class and checked, so a malformed override fails when settings
+are loaded rather than part way through a run.
+
+Environment variables are named after the setting with a prefix,
+GRJOBS_ for base.yaml (e.g. GRJOBS_BATCH_SIZE) and GRJOBS_ANALYSIS_ for
+analysis_config.yaml (e.g. GRJOBS_ANALYSIS_MAX_DF). Their values are parsed
+as yaml, so lists and null can be given. Paths are relative to the project
+directory unless absolute.
+
+Per-run overrides only reach settings read after configure is called, so
+they should be applied before loading models or data.
+
+  Typical usage example:
+
+  GRJOBS_N_JOBS=-1 GRJOBS_SPARSE=true python grjobs/pipeline/train_flow.py run
+
+  or:
+
+  settings = configure(parse_overrides(["n_jobs=4", "batch_size=500"]))
+  model = GreenClassifier()
+
+"""
+# ---------------------------------------------------------------------------------
+import os
+import datetime
+import dataclasses
+from functools import lru_cache
+from typing import Optional, Tuple, Union, get_args, get_origin, get_type_hints
+
+from grjobs import get_yaml_config, Path, PROJECT_DIR
+
+# ---------------------------------------------------------------------------------
+BASE_CONFIG_PATH = PROJECT_DIR / "grjobs/config/base.yaml"
+ANALYSIS_CONFIG_PATH = PROJECT_DIR / "grjobs/config/analysis_config.yaml"
+
+# ways GreenClassifier can handle imbalanced classes
+IMBALANCE_STRATEGIES = (
+    "smote",
+    "undersample",
+    "scale_pos_weight",
+    "sample_weight",
+    "none",
+)
+
+# overrides applied by configure, on top of the config file and environment
+_run_overrides = {}
+
+
+def _check(condition, message):
+    if not condition:
+        raise ValueError(f"Invalid settings: {message}")
+
+
+@dataclasses.dataclass(frozen=True)
+class Settings:
+    """
+    Pipeline settings, from base.yaml.
+
+    Attributes:
+        green_list_path: directory of the green words lists
+        pretrained_path: word2vec model used to expand the green words list
+        w2v_cache_path: memory-mappable copy of the word2vec model
+        model_output_path: directory models are saved to and loaded from
+        pred_output_path: directory predictions are saved to
+        labelled_jobs_path: directory of the labelled jobs Parquet dataset
+        profile_output_path: directory profile summaries are saved to
+        local_storage_path: directory read from by the local storage backend
+        storage_cache_path: directory of the S3 object cache
+        s3_bucket: S3 bucket of the job ads data
+        s3_prefix: key prefix of the job ads data in the S3 bucket
+        similar_words: number of similar words added per green word
+        w2v_vocab_limit: number of word2vec words loaded, all if None
+        storage_backend: where data is read from, "s3" or "local"
+        storage_cache_max_mb: maximum size of the S3 object cache
+        w2v_float16: store the cached word2vec vectors as float16
+        min_df: minimum document frequency of TF-IDF terms
+        max_df: maximum document frequency of TF-IDF terms
+        max_depth: maximum XGBoost tree depth
+        min_child_weight: minimum XGBoost child weight
+        n_estimators: number of XGBoost trees
+        imbalance_strategy: how classifiers handle imbalanced classes,
+            one of IMBALANCE_STRATEGIES
+        cascade: score job ads with the green count gate before the full
+            model
+        cascade_max_recall_loss: maximum proportion of training job ads of
+            the classes other than the gate class that the gate may
+            misclassify
+        test_size: proportion of labelled job ads held out for testing
+        n_shards: number of shards job ads are scored in
+        batch_size: number of job ads scored at a time per shard
+        n_jobs: number of processes used to clean job ads, -1 for all cores
+        chunk_size: number of job ads cleaned per process at a time
+        sparse: keep TF-IDF features of new models as a sparse matrix
+        feature_cache_path: SQLite feature cache of cleaned job ads, no
+            caching if None
+        service_model: name of the model served by the scoring service
+        service_max_batch_size: maximum number of job ads scored per batch
+        service_max_wait_ms: maximum time a batch waits for more job ads
+        service_host: host the scoring service listens on
+        service_port: port the scoring service listens on
+        streaming_chunk_size: number of job ads per streamed training chunk
+        streaming_n_features: number of hashed features of streamed models
+        tuning_n_folds: number of cross-validation folds candidates are
+            scored on when tuning
+        tuning_n_candidates: number of candidates sampled at random from
+            the tuning grid, 0 to search the whole grid
+        tuning_min_df: min_df values searched when tuning
+        tuning_max_df: max_df values searched when tuning
+        tuning_max_depth: max_depth values searched when tuning
+        tuning_min_child_weight: min_child_weight values searched when tuning
+    """
+
+    green_list_path: Path
+    pretrained_path: Path
+    w2v_cache_path: Path
+    model_output_path: Path
+    pred_output_path: Path
+    labelled_jobs_path: Path
+    profile_output_path: Path
+    local_storage_path: Path
+    storage_cache_path: Path
+    s3_bucket: str
+    s3_prefix: str
+    similar_words: int
+    w2v_vocab_limit: Optional[int]
+    storage_backend: str
+    storage_cache_max_mb: int
+    w2v_float16: bool
+    min_df: float
+    max_df: float
+    max_depth: int
+    min_child_weight: int
+    n_estimators: int
+    imbalance_strategy: str
+    cascade: bool
+    cascade_max_recall_loss: float
+    test_size: float
+    n_shards: int
+    batch_size: int
+    n_jobs: int
+    chunk_size: int
+    sparse: bool
+    feature_cache_path: Optional[Path]
+    service_model: str
+    service_max_batch_size: int
+    service_max_wait_ms: float
+    service_host: str
+    service_port: int
+    streaming_chunk_size: int
+    streaming_n_features: int
+    tuning_n_folds: int
+    tuning_n_candidates: int
+    tuning_min_df: Tuple[float, ...]
+    tuning_max_df: Tuple[float, ...]
+    tuning_max_depth: Tuple[int, ...]
+    tuning_min_child_weight: Tuple[int, ...]
+
+    def __post_init__(self):
+        _check(
+            self.storage_backend in ("s3", "local"),
+            f"storage_backend is {self.storage_backend!r}, expected 's3' or 'local'",
+        )
+        _check(
+            self.imbalance_strategy in IMBALANCE_STRATEGIES,
+            f"imbalance_strategy is {self.imbalance_strategy!r}, "
+            f"expected one of {', '.join(IMBALANCE_STRATEGIES)}",
+        )
+        for name in (
+            "similar_words",
+            "storage_cache_max_mb",
+            "n_estimators",
+            "n_shards",
+            "batch_size",
+            "chunk_size",
+            "service_max_batch_size",
+            "streaming_chunk_size",
+            "streaming_n_features",
+        ):
+            _check(getattr(self, name) > 0, f"{name} must be positive")
+        _check(self.n_jobs != 0, "n_jobs must be positive or negative, not 0")
+        _check(0 < self.test_size < 1, "test_size must be between 0 and 1")
+        _check(
+            0 <= self.cascade_max_recall_loss < 1,
+            "expected 0 <= cascade_max_recall_loss < 1",
+        )
+        _check(
+            0 <= self.min_df <= self.max_df <= 1, "expected 0 <= min_df <= max_df <= 1"
+        )
+        _check(
+            self.service_max_wait_ms >= 0, "service_max_wait_ms must not be negative"
+        )
+        _check(self.tuning_n_folds >= 2, "tuning_n_folds must be at least 2")
+        _check(
+            self.tuning_n_candidates >= 0, "tuning_n_candidates must not be negative"
+        )
+        for name in (
+            "tuning_min_df",
+            "tuning_max_df",
+            "tuning_max_depth",
+            "tuning_min_child_weight",
+        ):
+            _check(getattr(self, name), f"{name} must not be empty")
+
+
+@dataclasses.dataclass(frozen=True)
+class AnalysisSettings:
+    """
+    Analysis settings, from analysis_config.yaml.
+
+    Attributes:
+        font_path: font used in plots
+        embedding_store_path: directory of the job title embedding store
+        cluster_model_path: saved job title cluster model
+        embedding_model: sentence transformer model embedding job titles
+        embedding_dtype: dtype embeddings are stored as, float16 or float32
+        n_neighbors: number of UMAP neighbours
+        components: number of UMAP components
+        umap_metric: UMAP distance metric
+        cluster_size: minimum HDBSCAN cluster size
+        hdbscan_metric: HDBSCAN distance metric
+        method: HDBSCAN cluster selection method
+        max_df: maximum document frequency of cluster label terms
+        cluster_label_method: "per_cluster" or "class_tfidf"
+        membership_prob: minimum probability of a job title's cluster
+        salary_start_date: earliest date of job ads in the salary analysis
+        salary_quantiles: salary quantiles compared, between 0 and 1
+        salary_chunk_size: number of job ads processed at a time
+        sketch_relative_accuracy: relative accuracy of salary quantile sketches
+    """
+
+    font_path: Path
+    embedding_store_path: Path
+    cluster_model_path: Path
+    embedding_model: str
+    embedding_dtype: str
+    n_neighbors: int
+    components: int
+    umap_metric: str
+    cluster_size: int
+    hdbscan_metric: str
+    method: str
+    max_df: float
+    cluster_label_method: str
+    membership_prob: float
+    salary_start_date: datetime.date
+    salary_quantiles: Tuple[float, ...]
+    salary_chunk_size: int
+    sketch_relative_accuracy: float
+
+    def __post_init__(self):
+        _check(
+            self.embedding_dtype in ("float16", "float32"),
+            f"embedding_dtype is {self.embedding_dtype!r}, expected float16 or float32",
+        )
+        _check(
+            self.cluster_label_method in ("per_cluster", "class_tfidf"),
+            f"cluster_label_method is {self.cluster_label_method!r}, "
+            "expected 'per_cluster' or 'class_tfidf'",
+        )
+        for name in ("n_neighbors", "components", "cluster_size", "salary_chunk_size"):
+            _check(getattr(self, name) > 0, f"{name} must be positive")
+        _check(
+            all(0 <= q <= 1 for q in self.salary_quantiles),
+            "salary_quantiles must be between 0 and 1",
+        )
+        _check(
+            0 < self.sketch_relative_accuracy < 1,
+            "sketch_relative_accuracy must be between 0 and 1",
+        )
+        _check(
+            0 <= self.membership_prob <= 1, "membership_prob must be between 0 and 1"
+        )
+
+
+def _optional_type(field_type):
+    """Returns the type wrapped by Optional, or None if field_type is not
+    Optional."""
+    if get_origin(field_type) is Union:
+        types = [t for t in get_args(field_type) if t is not type(None)]
+        if len(types) == 1:
+            return types[0]
+    return None
+
+
+def parse_value(name, raw, field_type):
+    """Parses a setting given as a string, such as an environment variable.
+    Strings and paths are taken as they are, other values are parsed as yaml."""
+    import yaml
+
+    value_type = _optional_type(field_type)
+    if value_type is not None:
+        if raw.strip().lower() in ("", "null", "none"):
+            return None
+        field_type = value_type
+    if field_type in (str, Path):
+        return raw
+    try:
+        return yaml.safe_load(raw)
+    except yaml.YAMLError as e:
+        raise ValueError(f"Invalid settings: cannot parse {name}={raw!r}") from e
+
+
+def convert_value(name, value, field_type):
+    """Converts a setting to field_type, raising ValueError if it cannot be."""
+    value_type = _optional_type(field_type)
+    if value_type is not None:
+        return None if value is None else convert_value(name, value, value_type)
+
+    if get_origin(field_type) is tuple:
+        item_type = get_args(field_type)[0]
+        _check(isinstance(value, (list, tuple)), f"{name} must be a list")
+        return tuple(convert_value(name, item, item_type) for item in value)
+    if field_type is Path:
+        _check(isinstance(value, (str, Path)), f"{name} must be a path")
+        return PROJECT_DIR / value
+    if field_type is datetime.date:
+        if isinstance(value, str):
+            try:
+                return datetime.date.fromisoformat(value)
+            except ValueError:
+                pass
+        _check(isinstance(value, datetime.date), f"{name} must be a date, YYYY-MM-DD")
+        return value
+    if field_type is float:
+        _check(
+            isinstance(value, (int, float)) and not isinstance(value, bool),
+            f"{name} must be a number, not {value!r}",
+        )
+        return float(value)
+    # bool is a subclass of int, so is checked exactly
+    _check(
+        type(value) is field_type,
+        f"{name} must be {field_type.__name__}, not {value!r}",
+    )
+    return value
+
+
+def load_settings(settings_class, config_path, env_prefix, overrides=None):
+    """Loads settings from a yaml config file, then environment variables,
+    then overrides.
+
+    Args:
+        settings_class: Settings or AnalysisSettings
+        config_path: path to the yaml config file
+        env_prefix: prefix of environment variables overriding settings
+        overrides: dictionary of setting name to value, values given as
+            strings are parsed like environment variables
+
+    Returns:
+        A settings_class instance.
+    """
+    field_types = get_type_hints(settings_class)
+    values = {key.lower(): value for key, value in get_yaml_config(config_path).items()}
+    unknown = set(values) - set(field_types)
+    _check(not unknown, f"unknown keys {sorted(unknown)} in {config_path}")
+
+    for name, field_type in field_types.items():
+        raw = os.environ.get(env_prefix + name.upper())
+        if raw is not None:
+            values[name] = parse_value(env_prefix + name.upper(), raw, field_type)
+    for name, value in (overrides or {}).items():
+        _check(name in field_types, f"unknown setting {name}")
+        if isinstance(value, str):
+            value = parse_value(name, value, field_types[name])
+        values[name] = value
+
+    missing = set(field_types) - set(values)
+    _check(not missing, f"missing settings {sorted(missing)}")
+
+    return settings_class(
+        **{
+            name: convert_value(name, values[name], field_type)
+            for name, field_type in field_types.items()
+        }
+    )
+
+
+@lru_cache(maxsize=None)
+def get_settings():
+    """Loads the pipeline settings on first use."""
+    return load_settings(Settings, BASE_CONFIG_PATH, "GRJOBS_", _run_overrides)
+
+
+@lru_cache(maxsize=None)
+def get_analysis_settings():
+    """Loads the analysis settings on first use."""
+    return load_settings(AnalysisSettings, ANALYSIS_CONFIG_PATH, "GRJOBS_ANALYSIS_")
+
+
+def parse_overrides(assignments):
+    """Parses command line overrides of the form name=value to a dictionary."""
+    overrides = {}
+    for assignment in assignments:
+        name, sep, value = assignment.partition("=")
+        _check(sep, f"expected name=value, got {assignment!r}")
+        overrides[name.strip()] = value
+
+    return overrides
+
+
+def configure(overrides):
+    """Overrides pipeline settings for the rest of the run.
+
+    Args:
+        overrides: dictionary of setting name to value, values given as
+            strings are parsed like environment variables
+
+    Returns:
+        The overridden, validated settings.
+    """
+    previous = dict(_run_overrides)
+    _run_overrides.update(overrides)
+    get_settings.cache_clear()
+    try:
+        return get_settings()
+    except ValueError:
+        # keep the previous settings if the overrides are invalid
+        _run_overrides.clear()
+        _run_overrides.update(previous)
+        raise
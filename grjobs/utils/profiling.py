@@ -0,0 +1,164 @@
+# File: utils/profiling.py
+
+"""Module for opt-in timing of pipeline stages.
+
+Stages record their wall time, number of calls and number of items
+processed, from which throughput is derived. Profiling is enabled for a
+whole run by setting the GRJOBS_PROFILE environment variable to a value
+other than 0, false, no or off, in which case each process logs a summary
+when it exits and saves it as json in the profile output directory, named
+by process ID, or for a block of code with the profile context manager.
+When profiling is disabled, stages are not timed at all.
+
+Only stages run in the profiled process are recorded, so text cleaned
+in worker processes by clean_corpus with n_jobs > 1 is timed as a whole
+rather than stage by stage.
+
+  Typical usage example:
+
+  GRJOBS_PROFILE=1 python grjobs/pipeline/train_flow.py run
+
+  or:
+
+  with profile("profile.json"):
+    model.predict(job_ads)
+
+"""
+# ---------------------------------------------------------------------------------
+import os
+import json
+import time
+import atexit
+import threading
+import contextlib
+from functools import wraps
+
+# ---------------------------------------------------------------------------------
+# returned by Profiler.stage when disabled, nullcontext instances are reusable
+_UNTIMED_STAGE = contextlib.nullcontext()
+
+
+class Profiler:
+    """
+    Records wall time, calls and items processed per pipeline stage.
+
+    Attributes:
+        enabled: whether stages are timed
+        stats: dictionary of stage name to [calls, seconds, items]
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def record(self, name, seconds, items=1):
+        with self.lock:
+            stage_stats = self.stats.setdefault(name, [0, 0.0, 0])
+            stage_stats[0] += 1
+            stage_stats[1] += seconds
+            stage_stats[2] += items
+
+    @contextlib.contextmanager
+    def _timed_stage(self, name, items):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, items)
+
+    def stage(self, name, items=1):
+        """Returns a context manager timing a block of code as a stage
+        that processes items items."""
+        if not self.enabled:
+            return _UNTIMED_STAGE
+        return self._timed_stage(name, items)
+
+    def wrap(self, func, name=None):
+        """Returns func timed as a stage processing one item per call.
+        Callers check enabled before using the wrapped function."""
+        name = name or func.__name__
+
+        @wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(name, time.perf_counter() - start)
+
+        return timed
+
+    def summary(self):
+        """Returns stage statistics as a json-serialisable dictionary,
+        slowest stage first."""
+        with self.lock:
+            stats = sorted(self.stats.items(), key=lambda stage: -stage[1][1])
+
+        return {
+            name: {
+                "calls": calls,
+                "seconds": seconds,
+                "mean_ms": 1000 * seconds / calls,
+                "items": items,
+                "items_per_second": items / seconds if seconds else None,
+            }
+            for name, (calls, seconds, items) in stats
+        }
+
+    def report(self, summary_path=None):
+        """Logs the summary and saves it as json to summary_path, if given."""
+        from grjobs import logger
+
+        summary = self.summary()
+        for name, stage_stats in summary.items():
+            logger.info(
+                f"{name}: {stage_stats['calls']} calls, "
+                f"{stage_stats['seconds']:.3f}s, "
+                f"{stage_stats['mean_ms']:.3f}ms per call, "
+                f"{stage_stats['items_per_second'] or 0:.1f} items/s"
+            )
+        if summary_path is not None:
+            os.makedirs(os.path.dirname(summary_path) or ".", exist_ok=True)
+            with open(summary_path, "w") as f:
+                json.dump(summary, f, indent=2)
+
+        return summary
+
+    def reset(self):
+        with self.lock:
+            self.stats = {}
+
+
+# values of GRJOBS_PROFILE that leave profiling disabled
+DISABLED_VALUES = ("", "0", "false", "no", "off")
+
+profiler = Profiler(
+    enabled=os.environ.get("GRJOBS_PROFILE", "").strip().lower() not in DISABLED_VALUES
+)
+if profiler.enabled:
+    from grjobs.settings import get_settings
+
+    atexit.register(
+        profiler.report,
+        get_settings().profile_output_path / f"profile_{os.getpid()}.json",
+    )
+
+
+@contextlib.contextmanager
+def profile(summary_path=None):
+    """Profiles the stages run within a block, then reports their summary."""
+    enabled, stats = profiler.enabled, profiler.stats
+    profiler.enabled, profiler.stats = True, {}
+    try:
+        yield profiler
+    finally:
+        profiler.report(summary_path)
+        block_stats = profiler.stats
+        profiler.enabled, profiler.stats = enabled, stats
+        if enabled:
+            for name, (calls, seconds, items) in block_stats.items():
+                stage_stats = stats.setdefault(name, [0, 0.0, 0])
+                stage_stats[0] += calls
+                stage_stats[1] += seconds
+                stage_stats[2] += items
@@ -0,0 +1,305 @@
+# File: utils/storage.py
+
+"""Module for reading project data from S3 or a local directory.
+
+Objects are read through a storage backend, either an S3 bucket or a
+local directory mirroring the bucket's layout so that pipelines can run
+offline. Objects fetched from S3 are cached on local disk and revalidated
+against their ETag, so repeated runs do not download unchanged data again.
+The cache is limited in size and evicts the least recently used objects.
+
+Objects are read as file streams rather than decoded in memory, and json
+arrays and json lines files can be iterated over one record at a time.
+
+  Typical usage example:
+
+  store = get_object_store()
+  labelled_jobs = store.load_pickle("green_jobs_output.pkl")
+  for job_ad in store.iter_json("final_training_set.json"):
+    ...
+
+"""
+# ---------------------------------------------------------------------------------
+import io
+import os
+import json
+import pickle
+import hashlib
+import tempfile
+from functools import lru_cache
+
+from grjobs import Path, logger
+from grjobs.settings import get_settings
+
+# ---------------------------------------------------------------------------------
+# size of the chunks streamed json arrays are decoded from
+JSON_CHUNK_SIZE = 2 ** 20
+
+
+class S3Backend:
+    """
+    Storage backend reading objects from an S3 bucket.
+
+    Attributes:
+        bucket: name of the S3 bucket
+        prefix: key prefix objects are read from
+    """
+
+    def __init__(self, bucket, prefix=""):
+        # boto3 is slow to import and not needed to read local data
+        import boto3
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client("s3")
+
+    def stat(self, name):
+        """Returns the ETag and size in bytes of an object."""
+        head = self.client.head_object(Bucket=self.bucket, Key=self.prefix + name)
+        return head["ETag"], head["ContentLength"]
+
+    def download(self, name, f):
+        """Streams an object into a binary file object."""
+        self.client.download_fileobj(self.bucket, self.prefix + name, f)
+
+    def open(self, name):
+        """Opens an object as a binary file, spooled to a temporary file."""
+        f = tempfile.TemporaryFile()
+        self.download(name, f)
+        f.seek(0)
+        return f
+
+
+class LocalBackend:
+    """
+    Storage backend reading objects from a local directory.
+
+    Attributes:
+        root: directory objects are read from
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def stat(self, name):
+        """Returns the modification time and size in bytes of an object."""
+        stat = os.stat(self.root / name)
+        return str(stat.st_mtime_ns), stat.st_size
+
+    def download(self, name, f):
+        """Copies an object into a binary file object."""
+        with self.open(name) as source:
+            while True:
+                chunk = source.read(JSON_CHUNK_SIZE)
+                if not chunk:
+                    break
+                f.write(chunk)
+
+    def open(self, name):
+        """Opens an object as a binary file."""
+        return open(self.root / name, "rb")
+
+
+class DiskCache:
+    """
+    Size-limited local disk cache of objects read from a storage backend.
+
+    Each object is stored under a hash of its name with a metadata file
+    recording the validator (ETag or modification time) it was fetched
+    with. A cached object is served only if its validator still matches
+    the backend's. Files are written atomically, so concurrent processes
+    can share the cache.
+
+    Attributes:
+        cache_dir: directory cached objects are stored in
+        max_bytes: total size of cached objects beyond which the least
+            recently used objects are evicted
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def paths(self, name):
+        """Returns the data and metadata paths of a cached object."""
+        digest = hashlib.blake2b(name.encode(), digest_size=16).hexdigest()
+        return self.cache_dir / digest, self.cache_dir / f"{digest}.meta"
+
+    def fetch(self, backend, name):
+        """Returns the local path of an object, downloading it from the
+        backend if it is not cached or has changed."""
+        data_path, meta_path = self.paths(name)
+        validator, size = backend.stat(name)
+        try:
+            with open(meta_path) as f:
+                cached = json.load(f)["validator"] == validator
+        except (OSError, ValueError, KeyError):
+            cached = False
+
+        if cached and data_path.exists():
+            # mark as recently used for eviction
+            os.utime(data_path)
+            return data_path
+
+        self.evict(size)
+        logger.info(f"Downloading {name} to the storage cache")
+        with tempfile.NamedTemporaryFile(dir=self.cache_dir, delete=False) as f:
+            backend.download(name, f)
+        os.replace(f.name, data_path)
+        with tempfile.NamedTemporaryFile(
+            "w", dir=self.cache_dir, delete=False, suffix=".tmp"
+        ) as f:
+            json.dump({"name": name, "validator": validator, "size": size}, f)
+        os.replace(f.name, meta_path)
+
+        return data_path
+
+    def evict(self, incoming_bytes=0):
+        """Deletes least recently used objects until incoming_bytes more
+        fit within max_bytes."""
+        entries = []
+        for meta_path in self.cache_dir.glob("*.meta"):
+            data_path = meta_path.with_suffix("")
+            try:
+                stat = data_path.stat()
+            except FileNotFoundError:
+                meta_path.unlink(missing_ok=True)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, data_path, meta_path))
+
+        total_bytes = sum(size for _, size, _, _ in entries) + incoming_bytes
+        for _, size, data_path, meta_path in sorted(entries, key=lambda e: e[0]):
+            if total_bytes <= self.max_bytes:
+                break
+            meta_path.unlink(missing_ok=True)
+            data_path.unlink(missing_ok=True)
+            total_bytes -= size
+
+
+def iter_json_array(f, chunk_size=JSON_CHUNK_SIZE):
+    """Yields the elements of a json array from a text file one at a time,
+    decoding it in chunks rather than all at once."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    started = False
+    eof = False
+    while True:
+        # skip whitespace and separators up to the next element
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position < len(buffer):
+            if not started:
+                if buffer[position] != "[":
+                    raise ValueError("Expected a json array")
+                started = True
+                position += 1
+                continue
+            if buffer[position] == "]":
+                return
+            try:
+                element, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                end = None
+            # a number is only complete if followed by a separator, as it
+            # may continue in the next chunk
+            if end is not None and (
+                eof or (end < len(buffer) and buffer[end] in " \t\r\n,]")
+            ):
+                yield element
+                position = end
+                continue
+        if eof:
+            raise ValueError("Unexpected end of json array")
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
+class ObjectStore:
+    """
+    Reads objects from a storage backend through an optional disk cache.
+
+    Attributes:
+        backend: an S3Backend or LocalBackend
+        cache: a DiskCache, or None to stream objects directly
+    """
+
+    def __init__(self, backend, cache=None):
+        self.backend = backend
+        self.cache = cache
+
+    def stat(self, name):
+        """Returns the validator (ETag or modification time) and size in
+        bytes of an object, without reading it."""
+        return self.backend.stat(name)
+
+    def open(self, name):
+        """Opens an object as a binary file."""
+        if self.cache is None:
+            return self.backend.open(name)
+
+        return open(self.cache.fetch(self.backend, name), "rb")
+
+    def read_text(self, name):
+        """Reads an object as text."""
+        with self.open(name) as f:
+            return f.read().decode()
+
+    def load_json(self, name):
+        """Loads a json object."""
+        with self.open(name) as f:
+            return json.load(f)
+
+    def iter_json(self, name):
+        """Yields the records of a json array or, for names ending in
+        .jsonl, a json lines object one at a time."""
+        with self.open(name) as f, io.TextIOWrapper(f, encoding="utf-8") as text:
+            if name.endswith(".jsonl"):
+                for line in text:
+                    if line.strip():
+                        yield json.loads(line)
+            else:
+                yield from iter_json_array(text)
+
+    def load_pickle(self, name):
+        """Unpickles an object from its file stream."""
+        with self.open(name) as f:
+            return pickle.load(f)
+
+
+@lru_cache(maxsize=None)
+def _local_object_store(root):
+    return ObjectStore(LocalBackend(root))
+
+
+@lru_cache(maxsize=None)
+def _s3_object_store(bucket, prefix, cache_path, cache_max_mb):
+    return ObjectStore(
+        S3Backend(bucket, prefix), DiskCache(cache_path, cache_max_mb * 2 ** 20)
+    )
+
+
+def get_object_store(backend=None):
+    """Returns the project's object store, reading from S3 or, if backend
+    is "local", from the local storage directory. backend defaults to the
+    storage_backend setting.
+
+    Stores are created once per set of storage settings, so settings
+    overridden during a run are used by the next call.
+    """
+    settings = get_settings()
+    backend = backend or settings.storage_backend
+    if backend == "local":
+        return _local_object_store(settings.local_storage_path)
+    if backend != "s3":
+        raise ValueError(f"Unknown storage backend {backend}, expected s3 or local")
+
+    return _s3_object_store(
+        settings.s3_bucket,
+        settings.s3_prefix,
+        settings.storage_cache_path,
+        settings.storage_cache_max_mb,
+    )
@@ -10,22 +10,35 @@
   for text in list_of_job_description_texts:
     clean_text(text)
 
+  or, to clean a large corpus across processes:
+
+  for clean_description in clean_corpus(texts, n_jobs=4):
+    ...
+
 """
 # ---------------------------------------------------------------------------------
 
-import pandas as pd
 import string
 from string import digits
 from toolz import pipe
 import re
+import os
+import math
+import atexit
+import hashlib
+import multiprocessing
+from functools import lru_cache
+from itertools import islice
 
-import nltk
-from nltk import tokenize
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
+from grjobs.utils.profiling import profiler
 
 # ---------------------------------------------------------------------------------
-lemmatizer = WordNetLemmatizer()
+# NLTK and its corpora are slow to load, so they are only loaded when the
+# text cleaner is first used, and corpora are only downloaded if missing
+
+# Version of the cleaning pipeline, bump whenever a change to the pipeline
+# changes its output so that cached clean text is invalidated
+CLEANER_VERSION = 1
 
 ### Compiling regex patterns as they might get used many times over ###
 
@@ -47,18 +60,79 @@ compiled_missing_space_pattern = re.compile("([a-z])([A-Z])([a-z])")
 compiled_nonalphabet_nonnumeric_pattern = re.compile(r"([^a-zA-Z0-9 #(++)+])")
 compiled_padded_punctuation_pattern = re.compile(r"( )([^a-zA-Z0-9 #(++)+])")
 
+# Translation tables for remove_punct() and remove_digits()
+punct_translator = str.maketrans("", "", string.punctuation)
+digits_translator = str.maketrans("", "", digits)
+
+# Job-related stopwords, for remove_job_stopwords()
+job_stopwords = frozenset(
+    [
+        "recruit",
+        "role",
+        "cv",
+        "currently",
+        "skill",
+        "website",
+        "apply",
+        "please",
+        "background",
+        "desirable",
+        "someone",
+        "salary",
+        "work",
+        "career",
+        "job",
+        "hour",
+        "responsibility",
+        "data",
+        "now",
+        "experience",
+        "candidate",
+        "application",
+        "looking",
+        "seeking",
+        "hourly",
+        "hour",
+        "recruitment",
+        "opportunity",
+        "part",
+        "exciting",
+        "graduate",
+        "consultant",
+    ]
+)
+
 ### Components of the text preprocessing pipeline ###
 
 
+def load_nltk_resource(resource_path, package):
+    """Downloads an NLTK package unless the resource is already installed."""
+    import nltk
+
+    try:
+        nltk.data.find(resource_path)
+    except LookupError:
+        nltk.download(package, quiet=True)
+
+
 def WordNetLemmatizer():
-    nltk.download("wordnet")
+    import nltk
+
+    load_nltk_resource("corpora/wordnet", "wordnet")
     return nltk.WordNetLemmatizer()
 
 
+def load_stopwords():
+    """Loads the NLTK English stopwords."""
+    from nltk.corpus import stopwords
+
+    load_nltk_resource("corpora/stopwords", "stopwords")
+    return stopwords.words("english")
+
+
 def lemmatise(term):
     """Apply the NLTK WN Lemmatizer to the term"""
-    lem = WordNetLemmatizer()
-    return lem.lemmatize(term)
+    return get_text_cleaner().lemmatise(term)
 
 
 def clean_punctuation(text):
@@ -110,24 +184,21 @@ def lemmatize_paragraph(text):
     Note that this function has to be included in a processing pipeline as, on
     its own, it does not deal with punctuation marks or capital letters.
     """
-    text = " ".join([lemmatizer.lemmatize(token) for token in text.split(" ")])
-    return text
+    return get_text_cleaner().lemmatize_paragraph(text)
 
 
 def remove_punct(text):
     """
     removes punctuation
     """
-    punct = string.punctuation
-    translator = str.maketrans("", "", punct)
-    no_punct = text.translate(translator)
+    no_punct = text.translate(punct_translator)
 
     return no_punct
 
 
 def remove_stopwords(text):
     """Removes stopwords"""
-    stopws = stopwords.words("english")
+    stopws = get_text_cleaner().stopwords
 
     text = " ".join([token for token in text.split(" ") if token not in stopws])
 
@@ -136,41 +207,9 @@ def remove_stopwords(text):
 
 def remove_job_stopwords(text):
     """removes job-related stopwords."""
-    job_stops = [
-        "recruit",
-        "role",
-        "cv",
-        "currently",
-        "skill",
-        "website",
-        "apply",
-        "please",
-        "background",
-        "desirable",
-        "someone",
-        "salary",
-        "work",
-        "career",
-        "job",
-        "hour",
-        "responsibility",
-        "data",
-        "now",
-        "experience",
-        "candidate",
-        "application",
-        "looking",
-        "seeking",
-        "hourly",
-        "hour",
-        "recruitment",
-        "opportunity",
-        "part",
-        "exciting",
-        "graduate",
-        "consultant",
-    ]
-    text = " ".join([token for token in text.split(" ") if token not in job_stops])
+    text = " ".join(
+        [token for token in text.split(" ") if token not in job_stopwords]
+    )
 
     return text
 
@@ -178,8 +217,7 @@ def remove_job_stopwords(text):
 def remove_digits(text):
     """takes as input a string and returns string stripped of digits."""
 
-    nums = str.maketrans("", "", digits)
-    no_digits = text.translate(nums)
+    no_digits = text.translate(digits_translator)
 
     return no_digits
 
@@ -192,26 +230,159 @@ def clean_up(text):
 
 def word_tokenize(text):
     """tokenises text to the sentence level"""
+    from nltk import tokenize
+
     words = tokenize.word_tokenize(text)
     return words
 
 
+class TextCleaner:
+    """
+    Text cleaning engine behind clean_text.
+
+    Loads the stopword lists and the WordNet lemmatizer once and memoises
+    lemmas in a bounded LRU cache, as job ad vocabulary repeats heavily
+    across adverts.
+
+    Attributes:
+        lemma_cache_size: int(default = 2 ** 16)
+        version: hash of the pipeline version and the rules and word lists
+        it uses, which changes whenever cleaned output may change
+    """
+
+    def __init__(self, lemma_cache_size=2 ** 16):
+        self.lemma_cache_size = lemma_cache_size
+        self.stopwords = frozenset(load_stopwords())
+        self.job_stopwords = job_stopwords
+        self.lemmatise = lru_cache(maxsize=lemma_cache_size)(
+            WordNetLemmatizer().lemmatize
+        )
+        self.stages = (
+            detect_sentences,
+            lowercase,
+            clean_punctuation,
+            pad_punctuation,
+            self.lemmatize_paragraph,
+            self.remove_stopwords,
+            self.remove_job_stopwords,
+            remove_digits,
+            unpad_punctuation,
+            remove_punct,
+            word_tokenize,
+            clean_up,
+        )
+        self.profiled_stages = tuple(
+            profiler.wrap(stage, f"clean_text.{stage.__name__}")
+            for stage in self.stages
+        )
+        import nltk
+
+        self.version = hashlib.sha256(
+            repr(
+                (
+                    CLEANER_VERSION,
+                    nltk.__version__,
+                    punctuation_replacement_rules,
+                    sorted(self.stopwords),
+                    sorted(self.job_stopwords),
+                )
+            ).encode()
+        ).hexdigest()
+
+    def lemmatize_paragraph(self, text):
+        """Lemmatizes each word in a paragraph using the lemma cache"""
+        return " ".join([self.lemmatise(token) for token in text.split(" ")])
+
+    def remove_stopwords(self, text):
+        """Removes stopwords"""
+        return " ".join(
+            [token for token in text.split(" ") if token not in self.stopwords]
+        )
+
+    def remove_job_stopwords(self, text):
+        """removes job-related stopwords."""
+        return " ".join(
+            [token for token in text.split(" ") if token not in self.job_stopwords]
+        )
+
+    def clean(self, text):
+        """Runs text through each stage of the cleaning pipeline, timing
+        each stage if profiling is enabled"""
+        if profiler.enabled:
+            return pipe(text, *self.profiled_stages)
+        return pipe(text, *self.stages)
+
+
+@lru_cache(maxsize=None)
+def get_text_cleaner():
+    """Returns the text cleaner shared by this process."""
+    return TextCleaner()
+
+
 def clean_text(text):
     """
     Pipeline for preprocessing online job vacancy and skills-related text.
     """
-    return pipe(
-        text,
-        detect_sentences,
-        lowercase,
-        clean_punctuation,
-        pad_punctuation,
-        lemmatize_paragraph,
-        remove_stopwords,
-        remove_job_stopwords,
-        remove_digits,
-        unpad_punctuation,
-        remove_punct,
-        word_tokenize,
-        clean_up,
-    )
+    return get_text_cleaner().clean(text)
+
+
+# fewest texts per process worth sending to a pool, below which a batch
+# is cleaned in the calling process
+MIN_TEXTS_PER_JOB = 100
+
+
+@lru_cache(maxsize=None)
+def _get_pool(n_jobs, pid):
+    pool = multiprocessing.Pool(n_jobs)
+    atexit.register(pool.terminate)
+    return pool
+
+
+def get_pool(n_jobs):
+    """Returns a pool of n_jobs processes shared by every call in this
+    process, started on first use and terminated on exit. Forked processes
+    start their own pool."""
+    return _get_pool(n_jobs, os.getpid())
+
+
+def clean_corpus(texts, n_jobs=1, chunk_size=1000):
+    """
+    Cleans an iterable of texts with clean_text across a pool of n_jobs
+    processes, yielding cleaned texts in input order.
+
+    Texts are read lazily, up to chunk_size per process at a time, and at
+    most two such batches are held in memory, so large corpora can be
+    streamed through. Each batch is split evenly across as many processes
+    as can be given at least MIN_TEXTS_PER_JOB texts, and batches too
+    small to split across two processes are cleaned in the calling
+    process, as sending them to the pool costs more than it saves.
+    n_jobs=-1 uses all available cores.
+    """
+    if n_jobs == -1:
+        n_jobs = os.cpu_count()
+
+    if n_jobs == 1:
+        yield from map(clean_text, texts)
+        return
+
+    texts = iter(texts)
+    batch_size = chunk_size * n_jobs
+    pending = None
+    for batch in iter(lambda: list(islice(texts, batch_size)), []):
+        n_chunks = min(n_jobs, len(batch) // MIN_TEXTS_PER_JOB)
+        if n_chunks < 2:
+            cleaned = None
+        else:
+            # clean the next batch while the previous one is consumed
+            cleaned = get_pool(n_jobs).map_async(
+                clean_text,
+                batch,
+                chunksize=min(chunk_size, math.ceil(len(batch) / n_chunks)),
+            )
+        if pending is not None:
+            yield from pending.get()
+        if cleaned is None:
+            yield from map(clean_text, batch)
+        pending = cleaned
+    if pending is not None:
+        yield from pending.get()
@@ -0,0 +1,85 @@
+# File: tests/test_cascade.py
+
+"""Tests that cascade scoring skips the classifier for job ads below the
+green count gate without changing their predictions."""
+# ---------------------------------------------------------------------------------
+import json
+import random
+
+import pytest
+
+from grjobs.pipeline.green_classifier import GreenClassifier
+from grjobs.pipeline.green_count import GreenLexicon
+from grjobs.pipeline.model_bundle import save_model_bundle
+
+# ---------------------------------------------------------------------------------
+GREEN_WORDS = ["solar", "recycling", "wind turbine", "low carbon"]
+
+GREEN_TERMS = ["solar", "recycling", "wind turbine", "low carbon"]
+GREEN_CONTEXT = ["engineer", "installer", "energy", "site", "technician", "panels"]
+OTHER_CONTEXT = ["accountant", "ledger", "invoices", "sales", "retail", "payroll"]
+
+
+def make_job_ads(n_job_ads, green_share, green_terms_share=1.0, random_seed=0):
+    """Makes job ads of equal length, with green job ads mentioning one green
+    term if they are among green_terms_share of them."""
+    rng = random.Random(random_seed)
+    job_ads = []
+    for i in range(n_job_ads):
+        green = rng.random() < green_share
+        words = rng.choices(GREEN_CONTEXT if green else OTHER_CONTEXT, k=20)
+        if green and rng.random() < green_terms_share:
+            words[0] = rng.choice(GREEN_TERMS)
+        job_ads.append(
+            {
+                "id": i,
+                "job_title_raw": words[1],
+                "description": " ".join(words),
+                "label": "green" if green else "not_green",
+            }
+        )
+
+    return job_ads
+
+
+def fit_model(job_ads):
+    model = GreenClassifier(
+        green_lexicon=GreenLexicon(GREEN_WORDS),
+        params={"n_estimators": 10},
+        imbalance_strategy="none",
+    )
+    X_train, X_test, y_train, y_test = model.split_data(job_ads)
+    model.fit(X_train, y_train)
+
+    return model, X_test, y_test
+
+
+def test_cascade_skips_classifier_without_changing_predictions(tmp_path):
+    model, X_test, y_test = fit_model(make_job_ads(600, green_share=0.3))
+
+    assert model.gate_class == "not_green"
+    results = model.evaluate_cascade(X_test, y_test)
+    assert results["gated_fraction"] > 0.5
+    assert results["changed_fraction"] == 0
+    assert results["recall_loss"] == 0
+
+    save_model_bundle(model, tmp_path / "model")
+    with open(tmp_path / "model" / "manifest.json") as f:
+        gate = json.load(f)["gate"]
+    assert gate["threshold"] == pytest.approx(model.gate_threshold)
+
+
+def test_no_gate_is_learned_when_it_would_gate_nothing(tmp_path):
+    # a third of green job ads have no green terms, so any gate bounding
+    # the recall loss to 1% is at a green count of 0
+    model, X_test, y_test = fit_model(
+        make_job_ads(600, green_share=0.3, green_terms_share=2 / 3)
+    )
+
+    assert model.gate_class is None and model.gate_threshold is None
+
+    save_model_bundle(model, tmp_path / "model")
+    with open(tmp_path / "model" / "manifest.json") as f:
+        assert "gate" not in json.load(f)
+    with pytest.raises(ValueError):
+        model.evaluate_cascade(X_test, y_test)
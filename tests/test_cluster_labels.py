@@ -0,0 +1,50 @@
+# File: tests/test_cluster_labels.py
+
+"""Tests that clusters are named after the same top tfidf bigrams in one
+pass as when each cluster is vectorised on its own."""
+# ---------------------------------------------------------------------------------
+import numpy as np
+import pytest
+
+from grjobs.analysis.cluster_labels import (
+    get_cluster_tfidf_top_features,
+    get_tfidf_top_features,
+)
+
+# ---------------------------------------------------------------------------------
+CLUSTERS = {
+    0: ["solar panel engineer", "solar panel installer", "wind turbine engineer"],
+    1: ["waste management officer", "waste management lead", "recycling officer"],
+    # single word job titles have no bigrams
+    2: ["ecologist", "arborist"],
+}
+
+
+def per_cluster_top_features(n_top):
+    return {
+        cluster: get_tfidf_top_features(sents, n_top)
+        for cluster, sents in CLUSTERS.items()
+    }
+
+
+@pytest.mark.parametrize("n_top", [1, 2])
+def test_cluster_tfidf_matches_per_cluster(n_top):
+    sents = [sent for sents in CLUSTERS.values() for sent in sents]
+    labels = np.array([cluster for cluster, sents in CLUSTERS.items() for _ in sents])
+
+    cluster_names = get_cluster_tfidf_top_features(sents, labels, n_top)
+
+    assert cluster_names[0][0] == "solar panel"
+    assert cluster_names[1][0] == "waste management"
+    for cluster, top_features in per_cluster_top_features(n_top).items():
+        assert cluster_names[cluster][:1].tolist() == top_features[:1].tolist()
+        assert len(cluster_names[cluster]) == len(top_features)
+
+
+def test_clusters_without_bigrams_get_no_terms():
+    cluster_names = get_cluster_tfidf_top_features(
+        CLUSTERS[2], np.array([2, 2]), n_top=1
+    )
+
+    assert cluster_names[2].tolist() == []
+    assert get_tfidf_top_features(CLUSTERS[2]).tolist() == []
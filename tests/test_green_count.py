@@ -0,0 +1,70 @@
+# File: tests/test_green_count.py
+
+"""Tests that GreenLexicon scores job descriptions as green_count does."""
+# ---------------------------------------------------------------------------------
+import numpy as np
+import pytest
+
+from grjobs.pipeline.green_count import GreenLexicon, green_count
+
+# ---------------------------------------------------------------------------------
+GREEN_WORDS = [
+    "carbon",
+    "low carbon",
+    "low carbon energy",
+    "carbon energy",
+    "solar",
+    "solar solar",
+    "solar panel installer",
+    "recycling",
+    # terms repeated in the green list are counted once per repeat
+    "recycling",
+    "waste water",
+    "waste water",
+]
+
+TEXTS = [
+    # overlapping words and phrases
+    "we need a low carbon energy engineer for carbon energy projects",
+    "low carbon low carbon energy and more carbon",
+    # multi-word phrases
+    "experienced solar panel installer wanted to fit solar panel installer kits",
+    "waste water treatment and waste water recycling",
+    # repeated terms, including a phrase overlapping itself
+    "solar solar solar solar solar",
+    "recycling recycling recycling",
+    # phrases matching the end of a longer token
+    "yellow carbon paper and shallow carbon energy",
+    # punctuation splits tokens but not phrases
+    "carbon, low carbon. solar-panel installer",
+    "an accountant with no green terms",
+]
+
+
+@pytest.fixture(scope="module")
+def green_lexicon():
+    return GreenLexicon(GREEN_WORDS)
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_count_matches_green_count(green_lexicon, text):
+    assert green_lexicon.count(text) == pytest.approx(green_count(text, GREEN_WORDS))
+
+
+def test_transform_matches_green_count(green_lexicon):
+    expected = [green_count(text, GREEN_WORDS) for text in TEXTS]
+
+    green_counts = green_lexicon.transform(TEXTS)
+
+    assert green_counts.dtype == np.float32
+    np.testing.assert_allclose(green_counts, expected, rtol=1e-6)
+
+
+@pytest.mark.parametrize("green_words", [["recycling"], ["low carbon"], ["carbon"] * 3])
+def test_single_term_lexicons_match_green_count(green_words):
+    green_lexicon = GreenLexicon(green_words)
+
+    for text in TEXTS:
+        assert green_lexicon.count(text) == pytest.approx(
+            green_count(text, green_words)
+        )
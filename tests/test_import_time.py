@@ -0,0 +1,96 @@
+# File: tests/test_import_time.py
+
+"""Tests that grjobs modules import within their time budgets without
+loading heavy dependencies before they are used.
+
+Each module is imported with `python -X importtime` in a fresh interpreter
+started with -S, so that site startup hooks (sitecustomize and .pth files)
+cannot import dependencies on the module's behalf. The site-packages
+directories are put on the path directly instead.
+"""
+# ---------------------------------------------------------------------------------
+import os
+import re
+import site
+import subprocess
+import sys
+
+import pytest
+
+from grjobs import PROJECT_DIR
+
+# ---------------------------------------------------------------------------------
+# maximum cumulative import time in milliseconds
+BUDGETS_MS = {
+    "grjobs": 50,
+    "grjobs.utils.text_cleaning_utils": 200,
+    "grjobs.pipeline.green_count": 400,
+    "grjobs.pipeline.model_bundle": 400,
+    "grjobs.pipeline.green_classifier": 500,
+    "grjobs.pipeline.scoring_service": 600,
+}
+
+# dependencies that must not be imported with each module
+LAZY_DEPENDENCIES = {
+    "grjobs": ["yaml", "dotenv", "logging.config"],
+    "grjobs.utils.text_cleaning_utils": ["nltk", "pandas"],
+    "grjobs.pipeline.green_count": ["nltk", "boto3", "scipy"],
+    "grjobs.pipeline.model_bundle": ["sklearn", "xgboost"],
+    "grjobs.pipeline.green_classifier": ["nltk", "sklearn", "xgboost", "imblearn"],
+    "grjobs.pipeline.scoring_service": ["nltk", "sklearn", "xgboost", "imblearn"],
+}
+
+# the fastest of several runs is compared with the budget
+N_RUNS = 5
+
+IMPORT_TIME_PATTERN = re.compile(r"import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_module(module):
+    """Imports module in a fresh interpreter without site startup.
+
+    Returns:
+        The cumulative import time of the module in milliseconds and the
+        set of names in sys.modules after importing it.
+    """
+    env = {name: value for name, value in os.environ.items() if name != "PYTHONHOME"}
+    env["PYTHONPATH"] = os.pathsep.join([str(PROJECT_DIR), *site.getsitepackages()])
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-S",
+            "-X",
+            "importtime",
+            "-c",
+            f"import sys, {module}; print('\\n'.join(sys.modules))",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=env,
+    )
+    cumulative_us = None
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if match and match.group(3) == module and match.group(2) == " ":
+            cumulative_us = int(match.group(1))
+
+    return cumulative_us / 1000, set(result.stdout.split())
+
+
+@pytest.mark.parametrize("module", LAZY_DEPENDENCIES)
+def test_heavy_dependencies_are_not_imported(module):
+    _, imported = import_module(module)
+
+    assert not [
+        dependency
+        for dependency in LAZY_DEPENDENCIES[module]
+        if dependency in imported
+    ]
+
+
+@pytest.mark.parametrize("module", BUDGETS_MS)
+def test_import_time_within_budget(module):
+    time_ms = min(import_module(module)[0] for _ in range(N_RUNS))
+
+    assert time_ms <= BUDGETS_MS[module]